@@ -0,0 +1,219 @@
+"""
+Бенчмарк гарячих шляхів на синтетичній школі.
+
+    pip install -r requirements.txt -r requirements-dev.txt
+    python benchmarks/bench_hot_paths.py --students 600 --years 3 --output bench.json
+    python benchmarks/bench_hot_paths.py --compare bench.json
+
+Обробники викликаються напряму (без ConversationHandler) з фейковим Telegram API,
+база — mongomock. Результат — JSON: параметри школи і для кожного сценарію
+n / mean / p50 / p95 / p99 / max у мілісекундах та кількість викликів Bot API.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+from telegram.ext import Application, CallbackContext
+
+from harness import ROOT, FakeTelegramRequest, bot, build_school, callback_update, summarize, text_update, use_mongomock
+
+class FakeJobQueue:
+    """Замість JobQueue: send_lesson_reminder лише ставить наступне нагадування."""
+
+    def run_once(self, callback, when, data=None, name=None):
+        return None
+
+async def measure(name: str, scenario, iterations: int, calls: Counter, results: dict):
+    """Проганяє scenario(i) iterations разів; перший виклик — прогрів, у статистику не йде."""
+    await scenario(0)
+    calls.clear()
+    samples = []
+    for i in range(iterations):
+        started = time.perf_counter()
+        await scenario(i + 1)
+        samples.append(time.perf_counter() - started)
+    results[name] = {**summarize(samples),
+                     "bot_api_calls": round(sum(calls.values()) / max(iterations, 1), 2)}
+    print(f"  {name:<22} p50 {results[name]['p50_ms']:>9.3f} ms   p95 {results[name]['p95_ms']:>9.3f} ms",
+          file=sys.stderr)
+
+async def drain_outbox(app: Application) -> float:
+    """Запускає воркер розсилок без лімітів швидкості і чекає, поки outbox спорожніє; повертає секунди."""
+    engine = bot.BroadcastEngine()
+    engine.bucket = bot.TokenBucket(1e9)
+    started = time.perf_counter()
+    engine.start(app.bot)
+    engine.wakeup.set()
+    try:
+        while await bot.run_db(bot.col("outbox").count_documents, {"status": {"$in": ["pending", "sending"]}}):
+            await asyncio.sleep(0.01)
+    finally:
+        await engine.stop()
+    return time.perf_counter() - started
+
+async def run(args) -> dict:
+    use_mongomock()
+    bot.PER_CHAT_INTERVAL = 0.0
+    # Нагадування і воркер розсилок працюють лише на лідері — цей процес і є лідером на весь прогін
+    bot.LEASE_TTL = 24 * 3600
+    await bot.leader.renew()
+    bot.leader.leading = True   # без _take_over: воркер розсилок бенчмарк запускає сам
+    started = time.perf_counter()
+    school = build_school(args.students, args.parents, args.student_accounts, args.lessons, args.years)
+    seed_seconds = time.perf_counter() - started
+
+    calls = Counter()
+    app = (Application.builder().token(bot.BOT_TOKEN)
+           .request(FakeTelegramRequest(calls)).get_updates_request(FakeTelegramRequest(calls)).build())
+    await app.initialize()
+    tg_bot = app.bot
+    rnd = random.Random(args.seed)
+    parents, students = school["parents"], school["students"]
+    groups = sorted({lesson["group_id"] for lesson in school["schedule"]})
+
+    def context_for(update):
+        return CallbackContext.from_update(update, app)
+
+    async def call(handler, update):
+        return await handler(update, context_for(update))
+
+    async def start_known(i):
+        uid = rnd.choice(parents + students)
+        await call(bot.start, text_update(tg_bot, uid, "/start"))
+
+    async def start_cold(i):
+        bot.identity_cache.clear()
+        await start_known(i)
+
+    async def start_trainer(i):
+        await call(bot.start, text_update(tg_bot, bot.TRAINER_ID, "/start"))
+
+    async def student_schedule(i):
+        await call(bot.student_menu_handler, text_update(tg_bot, rnd.choice(students), "📅 Розклад занять"))
+
+    async def student_attendance(i):
+        await call(bot.student_menu_handler, text_update(tg_bot, rnd.choice(students), "✅ Моя відвідуваність"))
+
+    async def parent_attendance(i):
+        await call(bot.parent_menu_handler, text_update(tg_bot, rnd.choice(parents), "✅ Відвідуваність дитини"))
+
+    async def parent_homework(i):
+        await call(bot.parent_menu_handler, text_update(tg_bot, rnd.choice(parents), "📚 Домашні завдання"))
+
+    async def notify(i):
+        await bot.notify_group(None, rnd.choice(groups), "Бенчмарк")
+
+    async def reminder(i):
+        lesson = rnd.choice(school["schedule"])
+        context = SimpleNamespace(job=SimpleNamespace(data={"lesson": lesson, "lead": 2.0}, name="bench"),
+                                  job_queue=FakeJobQueue())
+        await bot.send_lesson_reminder(context)
+
+    def screen(handler, text):
+        async def scenario(i):
+            await call(handler, text_update(tg_bot, bot.TRAINER_ID, text))
+        return scenario
+
+    def page(view, deep=False):
+        async def scenario(i):
+            number = rnd.randrange(0, 5) if deep else 0
+            await call(bot.callback_handler, callback_update(tg_bot, bot.TRAINER_ID, f"pg_{view}_{number}"))
+        return scenario
+
+    async def journal(i):
+        await call(bot.callback_handler, callback_update(tg_bot, bot.TRAINER_ID, f"jr_a_{rnd.randrange(0, 5)}"))
+
+    scenarios = [
+        ("start_known", start_known),
+        ("start_cold", start_cold),
+        ("start_trainer", start_trainer),
+        ("student_schedule", student_schedule),
+        ("student_attendance", student_attendance),
+        ("parent_attendance", parent_attendance),
+        ("parent_homework", parent_homework),
+        ("notify_group", notify),
+        ("send_lesson_reminder", reminder),
+        ("attendance_stats", screen(bot.attendance_menu, "📊 Статистика відвідуваності")),
+        ("attendance_journal", journal),
+        ("list_students", screen(bot.students_menu, "📄 Показати всіх")),
+        ("list_parents", screen(bot.chat_menu, "👥 Список батьків")),
+        ("list_schedule", screen(bot.schedule_menu, "📋 Показати розклад")),
+        ("page_students", page("students", deep=True)),
+        ("page_delete_student", page("dstudent", deep=True)),
+        ("page_link_parent", page("lparent", deep=True)),
+    ]
+    results = {}
+    print(f"Школа: {seed_seconds:.2f} с на генерацію", file=sys.stderr)
+    for name, scenario in scenarios:
+        if args.only and name not in args.only:
+            continue
+        await measure(name, scenario, args.iterations, calls, results)
+
+    if not args.only or "outbox_drain" in args.only:
+        queued = await bot.run_db(bot.col("outbox").count_documents, {"status": "pending"})
+        seconds = await drain_outbox(app)
+        results["outbox_drain"] = {"messages": queued, "seconds": round(seconds, 3),
+                                   "messages_per_s": round(queued / seconds, 1) if seconds else 0.0}
+        print(f"  {'outbox_drain':<22} {queued} повідомлень за {seconds:.2f} с", file=sys.stderr)
+
+    await app.shutdown()
+    return {
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "only")},
+        "environment": {"python": platform.python_version(), "commit": git_commit()},
+        "results": results,
+    }
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+def compare(previous: dict, current: dict):
+    """Друкує зміну p50/p95 відносно попереднього прогону."""
+    print(f"\nПорівняння з {previous.get('environment', {}).get('commit', '?')}:", file=sys.stderr)
+    for name, now in current["results"].items():
+        before = previous.get("results", {}).get(name)
+        if not before or "p50_ms" not in now or not before.get("p50_ms"):
+            continue
+        change = (now["p50_ms"] - before["p50_ms"]) / before["p50_ms"] * 100
+        mark = "🐢" if change > 10 else "🚀" if change < -10 else "  "
+        print(f"  {mark} {name:<22} p50 {before['p50_ms']:>9.3f} → {now['p50_ms']:>9.3f} ms ({change:+.0f}%)",
+              file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк гарячих шляхів бота на синтетичній школі")
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--parents", type=int, default=300)
+    parser.add_argument("--student-accounts", type=int, default=200)
+    parser.add_argument("--lessons", type=int, default=18, help="занять у тижневому розкладі")
+    parser.add_argument("--years", type=float, default=2.0, help="років історії відвідуваності")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--only", nargs="*", help="запустити лише ці сценарії")
+    parser.add_argument("--output", help="куди записати JSON (за замовчуванням — stdout)")
+    parser.add_argument("--compare", help="JSON попереднього прогону для порівняння")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""
+Спільне для бенчмарків: бот на mongomock, фейковий Telegram API, синтетична школа, фабрики апдейтів.
+Потрібні залежності з requirements.txt і requirements-dev.txt (mongomock).
+"""
+
+import asyncio
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import mongomock
+from telegram import Update
+from telegram.request import BaseRequest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("BOT_TOKEN", "123456:bench")
+os.environ.setdefault("TRAINER_ID", "1")
+
+import chess_trainer_bot as bot  # noqa: E402
+
+# Логи бота на кожен апдейт спотворюють заміри
+logging.getLogger().setLevel(logging.WARNING)
+
+GROUPS = ["Початківці", "Середня", "Старша", "Турнірна", "Дорослі", "Дошкільна"]
+RANKS  = ["б/р", "3 розряд", "2 розряд", "1 розряд", "КМС"]
+DAYS   = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб"]
+
+PARENT_BASE  = 100_000_000
+STUDENT_BASE = 200_000_000
+
+# ─────────────────────────────────────────────
+# ФЕЙКОВИЙ TELEGRAM API
+# ─────────────────────────────────────────────
+class FakeTelegramRequest(BaseRequest):
+    """Відповідає на виклики Bot API без мережі; рахує їх по методах.
+
+    latency — штучна затримка відповіді (секунди), щоб імітувати мережу до Telegram.
+    """
+
+    def __init__(self, calls: Counter = None, latency: float = 0.0):
+        self.calls = calls if calls is not None else Counter()
+        self.latency = latency
+        self.message_id = 0
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def _message(self, params: dict) -> dict:
+        self.message_id += 1
+        chat_id = params.get("chat_id", 0)
+        return {"message_id": params.get("message_id", self.message_id), "date": int(time.time()),
+                "chat": {"id": int(chat_id), "type": "private"}, "text": params.get("text", "")}
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        endpoint = url.rsplit("/", 1)[-1]
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        params = request_data.parameters if request_data else {}
+        if endpoint == "getMe":
+            result = {"id": 1, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+        elif endpoint == "getUpdates":
+            result = []
+        elif endpoint in ("sendMessage", "editMessageText", "editMessageReplyMarkup", "sendDocument"):
+            result = self._message(params)
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode()
+
+# ─────────────────────────────────────────────
+# БАЗА
+# ─────────────────────────────────────────────
+def use_mongomock():
+    """Підміняє Atlas на mongomock і скидає кеші бота."""
+    bot.mongo_client = mongomock.MongoClient()
+    bot.mdb = bot.mongo_client["chess_trainer"]
+    if bot.db_executor is None:
+        bot.db_executor = ThreadPoolExecutor(max_workers=bot.MONGO_POOL_SIZE, thread_name_prefix="mongo")
+    bot.ensure_indexes()
+    bot.identity_cache.clear()
+    for cache in (bot.parents_cache, bot.student_users_cache, bot.schedule_cache, bot.homework_cache,
+                  bot.tournaments_cache):
+        cache.data = None
+    bot.render_cache.pages.clear()
+    bot.audience_index.built_from = None
+
+def build_school(students: int = 300, parents: int = 300, student_accounts: int = 200,
+                 lessons: int = 18, years: float = 2.0, seed: int = 1) -> dict:
+    """Заповнює базу синтетичною школою; повертає id користувачів для сценаріїв."""
+    rnd = random.Random(seed)
+    pupils = [{"name": f"Учень {i:04d}", "rank": rnd.choice(RANKS), "group": GROUPS[i % len(GROUPS)],
+               "parent_phone": f"+38050{i:07d}", "student_phone": f"+38067{i:07d}"}
+              for i in range(students)]
+    bot.col("students").insert_many([dict(p) for p in pupils])
+
+    parent_ids = []
+    docs = []
+    for i in range(parents):
+        child = pupils[i % students]
+        pid = str(PARENT_BASE + i)
+        parent_ids.append(pid)
+        docs.append({"pid": pid, "name": f"Батько {i:04d}", "student": child["name"],
+                     "group": child["group"], "rank": child["rank"]})
+    if docs:
+        bot.col("parents").insert_many(docs)
+
+    student_ids = []
+    docs = []
+    for i in range(min(student_accounts, students)):
+        uid = str(STUDENT_BASE + i)
+        student_ids.append(uid)
+        docs.append({"uid": uid, "name": f"Акаунт {i:04d}", "student_name": pupils[i]["name"],
+                     "group": pupils[i]["group"], "rank": pupils[i]["rank"]})
+    if docs:
+        bot.col("student_users").insert_many(docs)
+
+    schedule = [{"day": DAYS[i % len(DAYS)], "day_num": i % len(DAYS), "time": f"{15 + i % 5}:00",
+                 "group": GROUPS[i % len(GROUPS)], "place": f"Клас {1 + i % 3}"}
+                for i in range(lessons)]
+    if schedule:
+        bot.col("schedule").insert_many(schedule)
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    bot.col("homework").insert_many([{"group": GROUPS[i % len(GROUPS)], "task": f"Задача {i}",
+                                      "deadline": f"{today + timedelta(days=i % 14):%d.%m.%Y}",
+                                      "deadline_at": today + timedelta(days=i % 14)} for i in range(60)])
+    bot.col("tournaments").insert_many([{"title": f"Турнір {i}", "date": "01.09", "place": "Клуб",
+                                         "for_group": GROUPS[i % len(GROUPS)], "info": "—"} for i in range(20)])
+
+    # Журнал: по одному запису на кожен навчальний день за years років
+    by_group = {}
+    for p in pupils:
+        by_group.setdefault(p["group"], []).append(p["name"])
+    records = []
+    for d in range(int(365 * years)):
+        day = today - timedelta(days=d)
+        if day.weekday() == 6:
+            continue
+        names = by_group[GROUPS[day.weekday() % len(GROUPS)]]
+        absent = [n for n in names if rnd.random() < 0.15]
+        present = [n for n in names if n not in absent]
+        records.append({"key": day.strftime("%d-%m-%Y"), "day": day, "date": day.strftime("%d.%m.%Y"),
+                        "present": present, "absent": absent})
+    if records:
+        bot.col("attendance").insert_many(records)
+    bot.db_rebuild_attendance_stats()
+    bot.db_ensure_group_ids()   # група/розряд → id, як міграція при старті
+    return {"parents": parent_ids, "students": student_ids, "schedule": bot.db_get_schedule()}
+
+# ─────────────────────────────────────────────
+# АПДЕЙТИ
+# ─────────────────────────────────────────────
+_update_id = 0
+
+def _next_id() -> int:
+    global _update_id
+    _update_id += 1
+    return _update_id
+
+def _user(uid) -> dict:
+    return {"id": int(uid), "is_bot": False, "first_name": f"U{uid}"}
+
+def text_update_data(uid, text: str) -> dict:
+    """Сирий JSON апдейту з текстом — у такому вигляді апдейти записуються і відтворюються."""
+    message = {"message_id": _next_id(), "date": int(time.time()), "chat": {"id": int(uid), "type": "private"},
+               "from": _user(uid), "text": text}
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": _update_id, "message": message}
+
+def callback_update_data(uid, data: str) -> dict:
+    message = {"message_id": _next_id(), "date": int(time.time()), "chat": {"id": int(uid), "type": "private"},
+               "text": "…"}
+    query = {"id": str(_update_id), "from": _user(uid), "chat_instance": str(uid), "data": data,
+             "message": message}
+    return {"update_id": _update_id, "callback_query": query}
+
+def text_update(tg_bot, uid, text: str) -> Update:
+    return Update.de_json(text_update_data(uid, text), tg_bot)
+
+def callback_update(tg_bot, uid, data: str) -> Update:
+    return Update.de_json(callback_update_data(uid, data), tg_bot)
+
+# ─────────────────────────────────────────────
+# ЗВІТ
+# ─────────────────────────────────────────────
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+def summarize(samples: list) -> dict:
+    """Секунди → зведення в мілісекундах."""
+    ms = [s * 1000 for s in samples]
+    return {"n": len(ms), "mean_ms": round(statistics.fmean(ms), 3) if ms else 0.0,
+            "p50_ms": round(percentile(ms, 0.50), 3), "p95_ms": round(percentile(ms, 0.95), 3),
+            "p99_ms": round(percentile(ms, 0.99), 3), "max_ms": round(max(ms), 3) if ms else 0.0}
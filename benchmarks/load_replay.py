@@ -0,0 +1,189 @@
+"""
+Навантажувальний прогін: потік апдейтів через справжній Application з build_application().
+
+    python benchmarks/load_replay.py --users 2000 --ramp 60 --actions 4 --output load.json
+    python benchmarks/load_replay.py --users 500 --save rush.jsonl      # згенерувати і зберегти потік
+    python benchmarks/load_replay.py --replay rush.jsonl --speed 2       # відтворити записаний потік
+
+Апдейти потрапляють в update_queue так само, як з polling/webhook, і проходять через
+ConversationHandler, persistence, JobQueue і воркер розсилок. Telegram API — фейковий
+(--telegram-latency імітує мережу). Формат потоку — JSON lines {"at": секунди, "update": {...}}.
+Звіт: пропускна здатність, p50/p99 від постановки в чергу до завершення обробки,
+окремо час самої обробки, затримки event loop.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter
+
+from telegram import Update
+from telegram.ext import Application
+
+from harness import (FakeTelegramRequest, bot, build_school, callback_update_data, summarize,
+                     text_update_data, use_mongomock)
+
+PARENT_TAPS  = [button.text for row in bot.parent_keyboard().keyboard for button in row]
+STUDENT_TAPS = [button.text for row in bot.student_keyboard().keyboard for button in row]
+# Тренер ходить по меню: (кнопка або callback, ...) — один прохід на сесію
+TRAINER_ROUTES = [
+    ["📋 Список учнів", "📄 Показати всіх", "pg_students_1", "⬅️ Головне меню"],
+    ["✅ Відвідуваність", "📊 Статистика відвідуваності", "pg_attstats_1", "📋 Журнал за датою", "jr_m_0",
+     "⬅️ Головне меню"],
+    ["💬 Чат з батьками", "👥 Список батьків", "⬅️ Головне меню"],
+    ["📅 Розклад занять", "📋 Показати розклад", "⬅️ Головне меню"],
+]
+
+def generate(school: dict, args, rnd: random.Random) -> list:
+    """Вечірній пік: сесії користувачів стартують рівномірно протягом ramp, між натисканнями — пауза на роздуми."""
+    events = []
+    users = [("parent", uid) for uid in school["parents"]] + [("student", uid) for uid in school["students"]]
+    rnd.shuffle(users)
+    for role, uid in users[:args.users]:
+        at = rnd.uniform(0, args.ramp)
+        events.append((at, text_update_data(uid, "/start")))
+        taps = PARENT_TAPS if role == "parent" else STUDENT_TAPS
+        for _ in range(args.actions):
+            at += rnd.expovariate(1 / args.think) if args.think else 0
+            events.append((at, text_update_data(uid, rnd.choice(taps))))
+    at = 0.0
+    events.append((at, text_update_data(bot.TRAINER_ID, "/start")))
+    while at < args.ramp:
+        for step in rnd.choice(TRAINER_ROUTES):
+            at += rnd.expovariate(1 / args.think) if args.think else 0
+            data = (callback_update_data(bot.TRAINER_ID, step) if step[:3] in ("pg_", "jr_")
+                    else text_update_data(bot.TRAINER_ID, step))
+            events.append((at, data))
+        if not args.think:
+            break
+    events.sort(key=lambda e: e[0])
+    return events
+
+def load_stream(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        events = [json.loads(line) for line in f if line.strip()]
+    return sorted(((e["at"], e["update"]) for e in events), key=lambda e: e[0])
+
+def save_stream(path: str, events: list):
+    with open(path, "w", encoding="utf-8") as f:
+        for at, update in events:
+            f.write(json.dumps({"at": round(at, 4), "update": update}, ensure_ascii=False) + "\n")
+
+async def watch_loop_lag(samples: list, stop: asyncio.Event, interval: float = 0.01):
+    """Наскільки пізніше за заплановане прокидається event loop — мірило блокувань."""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        samples.append(max(0.0, loop.time() - expected))
+
+async def run(args) -> dict:
+    use_mongomock()
+    rnd = random.Random(args.seed)
+    parents = int(args.users * args.parent_share)
+    school = build_school(students=max(parents, args.users - parents, 1), parents=parents,
+                          student_accounts=args.users - parents, lessons=args.lessons, years=args.years,
+                          seed=args.seed)
+    events = load_stream(args.replay) if args.replay else generate(school, args, rnd)
+    if args.save:
+        save_stream(args.save, events)
+        print(f"💾 {len(events)} апдейтів збережено в {args.save}", file=sys.stderr)
+
+    calls = Counter()
+    builder = (Application.builder().token(bot.BOT_TOKEN)
+               .request(FakeTelegramRequest(calls, args.telegram_latency))
+               .get_updates_request(FakeTelegramRequest(calls)))
+    app = bot.build_application(builder)
+
+    enqueued, latency, handling = {}, [], []
+    errors = Counter()
+    process_update = app.process_update
+
+    async def timed_process_update(update):
+        started = time.perf_counter()
+        try:
+            await process_update(update)
+        finally:
+            done = time.perf_counter()
+            handling.append(done - started)
+            if isinstance(update, Update) and update.update_id in enqueued:
+                latency.append(done - enqueued.pop(update.update_id))
+
+    async def count_error(update, context):
+        errors[type(context.error).__name__] += 1
+
+    app.process_update = timed_process_update
+    app.add_error_handler(count_error)
+
+    await app.initialize()
+    await app.post_init(app)
+    await app.start()
+
+    lag, stop = [], asyncio.Event()
+    lag_task = asyncio.create_task(watch_loop_lag(lag, stop))
+    began = time.perf_counter()
+    for at, data in events:
+        if args.speed:
+            delay = began + at / args.speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        update = Update.de_json(data, app.bot)
+        enqueued[update.update_id] = time.perf_counter()
+        await app.update_queue.put(update)
+    fed = time.perf_counter() - began
+    await app.update_queue.join()
+    elapsed = time.perf_counter() - began
+    stop.set()
+    await lag_task
+
+    await app.stop()
+    await app.post_stop(app)
+    await app.shutdown()
+
+    report = {
+        "params": {k: v for k, v in vars(args).items() if k not in ("output", "save")},
+        "updates": len(events),
+        "seconds": round(elapsed, 3),
+        "feed_seconds": round(fed, 3),
+        "throughput_per_s": round(len(events) / elapsed, 1) if elapsed else 0.0,
+        "latency": summarize(latency),
+        "handling": summarize(handling),
+        "loop_lag": summarize(lag),
+        "errors": dict(errors),
+        "bot_api_calls": dict(calls),
+    }
+    print(f"⚡ {len(events)} апдейтів за {elapsed:.2f} с ({report['throughput_per_s']}/с); "
+          f"черга+обробка p50 {report['latency']['p50_ms']} мс, p99 {report['latency']['p99_ms']} мс; "
+          f"лаг циклу p99 {report['loop_lag']['p99_ms']} мс; помилок {sum(errors.values())}", file=sys.stderr)
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Навантажувальний прогін апдейтів через Application")
+    parser.add_argument("--users", type=int, default=2000, help="користувачів у піку")
+    parser.add_argument("--parent-share", type=float, default=0.7, help="частка батьків серед користувачів")
+    parser.add_argument("--actions", type=int, default=3, help="натискань меню після /start")
+    parser.add_argument("--ramp", type=float, default=60.0, help="за скільки секунд стартують усі сесії")
+    parser.add_argument("--think", type=float, default=2.0, help="середня пауза між натисканнями, с")
+    parser.add_argument("--speed", type=float, default=1.0, help="прискорення часу; 0 — без пауз, усе одразу")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="відповідь Bot API, с")
+    parser.add_argument("--lessons", type=int, default=18)
+    parser.add_argument("--years", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--replay", help="відтворити потік з JSON lines замість генерації")
+    parser.add_argument("--save", help="зберегти потік у JSON lines")
+    parser.add_argument("--output", help="куди записати JSON-звіт (за замовчуванням — stdout)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main()
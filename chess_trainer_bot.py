@@ -3,15 +3,35 @@
 НОВЕ: Групові сповіщення — батьки/учні отримують тільки повідомлення своєї групи
 """
 
+import asyncio
+import csv
+import functools
+import hashlib
+import io
 import logging
 import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
-from datetime import datetime
-from pymongo import MongoClient
+from datetime import datetime, time as dtime, timedelta, timezone
+from zoneinfo import ZoneInfo
+from bson import ObjectId
+from openpyxl import Workbook, load_workbook
+from bson.errors import InvalidId
+from prometheus_client import Counter, Histogram, start_http_server
+from pymongo import DeleteOne, InsertOne, MongoClient, ReplaceOne, ReturnDocument, UpdateMany, UpdateOne, monitoring
+from pymongo import timeout as mongo_timeout
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
 from telegram.ext import (
     Application, CommandHandler, MessageHandler,
-    CallbackQueryHandler, ContextTypes, filters, ConversationHandler
+    CallbackQueryHandler, ContextTypes, filters, ConversationHandler,
+    BasePersistence, BaseUpdateProcessor, PersistenceInput
 )
 
 # ─────────────────────────────────────────────
@@ -20,6 +40,96 @@ from telegram.ext import (
 BOT_TOKEN  = os.environ.get("BOT_TOKEN")
 TRAINER_ID = int(os.environ.get("TRAINER_ID", "0"))
 
+# Webhook замість polling: вмикається, якщо задано публічну адресу сервісу (на Render web service —
+# автоматично з RENDER_EXTERNAL_URL). Секрет без WEBHOOK_SECRET виводиться з токена, тож однаковий
+# у всіх процесах: при rolling restart новий процес не робить секрет старого недійсним.
+WEBHOOK_URL    = os.environ.get("WEBHOOK_URL") or os.environ.get("RENDER_EXTERNAL_URL", "")
+WEBHOOK_PATH   = os.environ.get("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = (os.environ.get("WEBHOOK_SECRET")
+                  or hashlib.sha256(f"webhook:{os.environ.get('BOT_TOKEN', '')}".encode()).hexdigest())
+PORT           = int(os.environ.get("PORT", "8443"))
+
+# Бот обробляє лише повідомлення і натискання inline-кнопок
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+# Апдейти, що Telegram накопичив за час рестарту, обробляються після старту — рестарт непомітний.
+# DROP_PENDING_UPDATES=1 відкидає їх (наприклад, щоб не розгрібати чергу після довгого простою)
+DROP_PENDING_UPDATES = os.environ.get("DROP_PENDING_UPDATES", "") == "1"
+
+# Пул потоків для MongoDB: розмір пулу і таймаут одного запиту (секунди)
+MONGO_POOL_SIZE = int(os.environ.get("MONGO_POOL_SIZE", "10"))
+MONGO_TIMEOUT   = float(os.environ.get("MONGO_TIMEOUT", "10"))
+# Скільки апдейтів різних користувачів обробляються одночасно (апдейти одного користувача — по черзі)
+UPDATE_CONCURRENCY = int(os.environ.get("UPDATE_CONCURRENCY", str(MONGO_POOL_SIZE)))
+
+# MONGO_EXPLAIN=1 — при старті перевірити плани запитів і залогувати ті, що сканують колекцію
+MONGO_EXPLAIN = os.environ.get("MONGO_EXPLAIN", "") == "1"
+
+# Як часто (секунди) кеш звіряє версію колекції з Mongo
+CACHE_TTL = float(os.environ.get("CACHE_TTL", "30"))
+
+# Розсилки: глобальний ліміт Telegram (~30/с) з запасом, паралельність, інтервал для одного чату
+BROADCAST_RATE        = float(os.environ.get("BROADCAST_RATE", "25"))
+BROADCAST_CONCURRENCY = int(os.environ.get("BROADCAST_CONCURRENCY", "8"))
+PER_CHAT_INTERVAL     = 1.0
+
+# Черга повідомлень (outbox): розмір пачки, опитування, спроби і базова затримка повтору (секунди)
+OUTBOX_BATCH        = int(os.environ.get("OUTBOX_BATCH", "50"))
+OUTBOX_POLL         = float(os.environ.get("OUTBOX_POLL", "5"))
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_BACKOFF      = float(os.environ.get("OUTBOX_BACKOFF", "5"))
+OUTBOX_STALE        = 300   # "sending" довше за це — процес впав посеред відправки
+
+# Скільки занять показувати на одній сторінці журналу
+JOURNAL_PAGE = 10
+
+# Пагінація списків: записів на сторінці, кнопок на сторінці, ліміт довжини повідомлення Telegram
+PAGE_SIZE     = int(os.environ.get("PAGE_SIZE", "10"))
+BUTTON_PAGE   = int(os.environ.get("BUTTON_PAGE", "8"))
+MESSAGE_LIMIT = 4096
+PAGE_CHARS    = MESSAGE_LIMIT - 256   # тіло сторінки готового списку — із запасом на заголовок
+
+# Імпорт учнів з файлу: рядків в одному bulk_write і максимум рядків у файлі
+IMPORT_BATCH    = int(os.environ.get("IMPORT_BATCH", "500"))
+IMPORT_MAX_ROWS = int(os.environ.get("IMPORT_MAX_ROWS", "10000"))
+
+# Експорт у файл: скільки байтів тримати в пам'яті до переходу на диск і ліміт часу на запити (секунди)
+EXPORT_SPOOL   = 4 * 1024 * 1024
+EXPORT_TIMEOUT = float(os.environ.get("EXPORT_TIMEOUT", "300"))
+
+# Ліміт часу (секунди) на міграції старих документів при старті
+MIGRATION_TIMEOUT = float(os.environ.get("MIGRATION_TIMEOUT", "600"))
+
+# Кілька реплік: фонові задачі виконує лише лідер; lease живе LEASE_TTL секунд і продовжується втричі частіше
+LEASE_TTL   = float(os.environ.get("LEASE_TTL", "15"))
+LEASE_RENEW = LEASE_TTL / 3
+
+# О котрій годині нагадувати про завтрашній дедлайн домашнього завдання
+HOMEWORK_REMINDER_HOUR = int(os.environ.get("HOMEWORK_REMINDER_HOUR", "18"))
+
+# Скільки днів новини і журнал лежать у робочих колекціях (0 — назавжди); старші переносяться в *_archive
+NEWS_RETENTION_DAYS       = int(os.environ.get("NEWS_RETENTION_DAYS", "180"))
+ATTENDANCE_RETENTION_DAYS = int(os.environ.get("ATTENDANCE_RETENTION_DAYS", "400"))
+# Перенесення пачками по ARCHIVE_BATCH документів з паузою ARCHIVE_PAUSE секунд між ними
+ARCHIVE_BATCH = int(os.environ.get("ARCHIVE_BATCH", "200"))
+ARCHIVE_PAUSE = float(os.environ.get("ARCHIVE_PAUSE", "0.5"))
+# Через скільки днів після перенесення архівні документи видаляє TTL-індекс (0 — зберігати завжди).
+# Статистика відвідуваності від цього не залежить — вона в лічильниках і місячних підсумках.
+ARCHIVE_TTL_DAYS = int(os.environ.get("ARCHIVE_TTL_DAYS", "0"))
+
+# Як часто (секунди) PTB передає змінені стани розмов і user_data у persistence
+PERSISTENCE_INTERVAL = float(os.environ.get("PERSISTENCE_INTERVAL", "30"))
+
+# Метрики у форматі Prometheus: локальний порт (0 — вимкнено)
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9100"))
+
+# Часовий пояс розкладу і щоденних задач: справжня зона, а не поточний зсув — інакше після
+# переходу на літній/зимовий час нагадування, поставлене на тиждень уперед, зсувається на годину
+TIMEZONE = ZoneInfo(os.environ.get("TIMEZONE", "Europe/Kyiv"))
+
+# За скільки годин до заняття надсилати нагадування, напр. "24,2"
+REMINDER_LEADS = [float(h) for h in os.environ.get("REMINDER_LEADS", "24,2").split(",") if h.strip()]
+
 logging.basicConfig(
     format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
     level=logging.INFO
@@ -37,17 +147,147 @@ logger = logging.getLogger(__name__)
     PARENT_MENU, STUDENT_MENU,
     TOURNAMENTS_MENU, ADD_TOURNAMENT,
     CHOOSE_ROLE, REGISTER_STUDENT,
-    LINK_PARENT
-) = range(21)
+    LINK_PARENT, IMPORT_STUDENTS
+) = range(22)
+
+# ─────────────────────────────────────────────
+# МЕТРИКИ
+# ─────────────────────────────────────────────
+HANDLER_SECONDS = Histogram("bot_handler_seconds", "Час обробки апдейту", ["handler", "action"])
+HANDLER_ERRORS  = Counter("bot_handler_errors_total", "Винятки в обробниках", ["handler"])
+DB_CALL_SECONDS = Histogram("bot_db_call_seconds", "db_* хелпер разом з очікуванням у пулі потоків", ["helper"])
+MONGO_SECONDS   = Histogram("bot_mongo_command_seconds", "Команди MongoDB", ["collection", "command"])
+MONGO_FAILURES  = Counter("bot_mongo_command_failures_total", "Команди MongoDB з помилкою", ["collection", "command"])
+BROADCAST_QUEUED   = Counter("bot_broadcast_queued_total", "Повідомлення, поставлені в outbox")
+BROADCAST_MESSAGES = Counter("bot_broadcast_messages_total", "Спроби доставки з outbox", ["status"])
+BROADCAST_PAUSES   = Counter("bot_broadcast_rate_limited_total", "Відповіді RetryAfter від Telegram")
+
+class MongoMetrics(monitoring.CommandListener):
+    """Рахує кількість і тривалість команд MongoDB по колекціях."""
+
+    def __init__(self):
+        self.pending = {}   # (connection, request_id) → (колекція, команда)
+
+    def _key(self, event):
+        return event.connection_id, event.request_id
+
+    def started(self, event):
+        target = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            target = event.command.get("collection")
+        self.pending[self._key(event)] = (target if isinstance(target, str) else "", event.command_name)
+
+    def succeeded(self, event):
+        labels = self.pending.pop(self._key(event), ("", event.command_name))
+        MONGO_SECONDS.labels(*labels).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        labels = self.pending.pop(self._key(event), ("", event.command_name))
+        MONGO_SECONDS.labels(*labels).observe(event.duration_micros / 1e6)
+        MONGO_FAILURES.labels(*labels).inc()
+
+@functools.lru_cache(maxsize=1)
+def menu_labels() -> frozenset:
+    """Тексти всіх кнопок меню — лише вони йдуть у мітку action, щоб вільний текст не роздував метрики."""
+    keyboards = [main_keyboard, students_keyboard, schedule_keyboard, homework_keyboard, news_keyboard,
+                 materials_keyboard, chat_keyboard, attendance_keyboard, tournaments_keyboard,
+                 parent_keyboard, student_keyboard, role_keyboard, back_keyboard]
+    return frozenset(button.text for keyboard in keyboards for row in keyboard().keyboard for button in row)
+
+# Префікс callback_data → мітка action (перший збіг); ні id, ні сторінки, ні дати в мітку не потрапляють
+CALLBACK_ACTIONS = {
+    "att_present_": "att_present", "att_absent_": "att_absent", "att_save": "att_save",
+    "jr_custom": "jr_custom", "jr_c": "jr_custom", "jr_": "jr",
+    "exp_att_": "exp_att", "exp_students_": "exp_students", "pg_": "pg",
+    "link_parent_": "link_parent", "link_student_": "link_student",
+    "del_student_": "del_student", "del_schedule_": "del_schedule", "del_hw_": "del_hw",
+    "del_news_": "del_news", "del_material_": "del_material", "del_tournament_": "del_tournament",
+}
+
+def callback_action(data: str) -> str:
+    """att_present_3 → att_present, jr_c0101202531012025_0 → jr_custom, невідоме → other."""
+    return next((action for prefix, action in CALLBACK_ACTIONS.items() if data.startswith(prefix)), "other")
+
+def update_action(update) -> str:
+    if not isinstance(update, Update):
+        return ""
+    if update.callback_query:
+        return callback_action(update.callback_query.data or "")
+    if update.message and update.message.text:
+        text = update.message.text
+        if text.startswith("/"):
+            return text.split()[0]
+        return text if text in menu_labels() else "text"
+    return ""
+
+def timed(handler):
+    """Декоратор: гістограма часу виконання обробника з міткою дії (кнопка меню / префікс callback)."""
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        action = update_action(args[0]) if args else ""
+        started = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        except Exception:
+            HANDLER_ERRORS.labels(handler.__name__).inc()
+            raise
+        finally:
+            HANDLER_SECONDS.labels(handler.__name__, action).observe(time.perf_counter() - started)
+    return wrapper
 
 # ─────────────────────────────────────────────
 # MONGODB
 # ─────────────────────────────────────────────
 mongo_client = None
 mdb = None
+db_executor = None
+
+# (колекція, ключі, опції) — створюються при старті, повторний виклик нічого не змінює
+INDEXES = [
+    ("students",         [("student_phone", 1)], {}),
+    ("students",         [("name", 1)], {}),
+    ("schedule",         [("day_num", 1)], {}),
+    ("homework",         [("deadline_at", 1)], {}),
+    ("homework",         [("group_id", 1), ("deadline_at", 1)], {}),
+    ("groups",           [("key", 1)], {"unique": True}),
+    ("parents",          [("name", 1)], {}),
+    ("parents",          [("pid", 1)], {"unique": True}),
+    ("student_users",    [("uid", 1)], {"unique": True}),
+    ("attendance",       [("key", 1)], {"unique": True}),
+    ("attendance",       [("day", -1)], {}),
+    ("attendance_stats", [("name", 1)], {"unique": True}),
+    ("attendance_archive", [("day", 1)], {}),
+    ("conversations",    [("name", 1)], {}),
+    ("outbox",           [("status", 1), ("next_at", 1)], {}),
+    ("outbox",           [("job_id", 1), ("status", 1)], {}),
+    ("outbox",           [("claim", 1)], {}),
+    ("outbox",           [("done_at", 1)], {"expireAfterSeconds": 7 * 24 * 3600}),
+    ("outbox_jobs",      [("created", 1)], {"expireAfterSeconds": 30 * 24 * 3600}),
+]
+if ARCHIVE_TTL_DAYS:
+    INDEXES += [(name, [("archived_at", 1)], {"expireAfterSeconds": ARCHIVE_TTL_DAYS * 24 * 3600})
+                for name in ("news_archive", "attendance_archive")]
+
+# Точкові запити db_* хелперів (колекція, фільтр, сортування) — для перевірки планів у режимі MONGO_EXPLAIN.
+# Повні вибірки find({}) сюди не входять: вони сканують колекцію за задумом.
+EXPLAIN_QUERIES = [
+    ("students",         {"student_phone": "+380000000000"}, None),
+    ("parents",          {"pid": "0"}, None),
+    ("student_users",    {"uid": "0"}, None),
+    ("homework",         {"deadline_at": {"$gte": datetime(2025, 1, 1)}}, None),
+    ("homework",         {"group_id": "?", "deadline_at": {"$gte": datetime(2025, 1, 1)}}, None),
+    ("groups",           {"key": "?"}, None),
+    ("attendance",       {"key": "01-01-2025"}, None),
+    ("attendance",       {"day": {"$gte": datetime(2025, 1, 1)}}, [("day", -1)]),
+    ("attendance_stats", {"name": "?"}, None),
+    ("attendance_archive", {"day": {"$gte": datetime(2025, 1, 1), "$lt": datetime(2025, 2, 1)}}, None),
+    ("outbox",          {"status": "pending", "next_at": {"$lte": datetime(2025, 1, 1)}}, [("next_at", 1)]),
+    ("outbox",           {"job_id": "?", "status": {"$in": ["pending", "sending"]}}, None),
+    ("outbox",           {"claim": "?"}, None),
+]
 
 def init_mongo():
-    global mongo_client, mdb
+    global mongo_client, mdb, db_executor
     uri = os.environ.get("MONGODB_URI")
     logger.info(f"🔗 MONGODB_URI: {'✅ знайдено' if uri else '❌ ПОРОЖНЬО!'}")
     if not uri:
@@ -55,192 +295,1125 @@ def init_mongo():
     mongo_client = MongoClient(
         uri,
         serverSelectionTimeoutMS=5000,
+        timeoutMS=int(MONGO_TIMEOUT * 1000),
+        maxPoolSize=MONGO_POOL_SIZE,
         tls=True,
-        tlsAllowInvalidCertificates=True
+        tlsAllowInvalidCertificates=True,
+        event_listeners=[MongoMetrics()]
     )
     mdb = mongo_client["chess_trainer"]
     mongo_client.admin.command("ping")
+    ensure_indexes()
+    run_migrations()
+    if MONGO_EXPLAIN:
+        explain_queries()
+    db_executor = ThreadPoolExecutor(max_workers=MONGO_POOL_SIZE, thread_name_prefix="mongo")
     logger.info("✅ MongoDB Atlas підключено!")
 
 def col(name):
     return mdb[name]
 
+def run_migrations():
+    """Доповнює документи, збережені старими версіями бота. Виконується при старті, до прийому апдейтів.
+
+    Кожна міграція пише пачками і нічого не робить, якщо все вже оновлено. На всю історію дається
+    MIGRATION_TIMEOUT, а не MONGO_TIMEOUT одного запиту: перший запуск на роках журналу довгий.
+    """
+    with mongo_timeout(MIGRATION_TIMEOUT):
+        db_ensure_attendance_stats()
+        for migrate, label in ((db_ensure_attendance_days, "📅 day у журналі"),
+                               (db_ensure_schedule_day_num, "📅 day_num у розкладі"),
+                               (db_ensure_homework_deadlines, "📚 deadline_at у завданнях"),
+                               (db_ensure_group_ids, "👥 group_id/rank_id")):
+            updated = migrate()
+            if updated:
+                logger.info(f"{label}: оновлено {updated} документів")
+
+def ensure_indexes():
+    for name, keys, options in INDEXES:
+        try:
+            col(name).create_index(keys, **options)
+        except OperationFailure as e:
+            logger.warning(f"⚠️ Індекс {name} {keys} не створено: {e}")
+
+def _plan_stages(plan: dict) -> list:
+    stages = [plan.get("stage")]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            stages += _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        stages += _plan_stages(child)
+    return stages
+
+def explain_queries():
+    """Логує запити, для яких MongoDB обирає COLLSCAN замість індексу."""
+    slow = 0
+    for name, query, sort in EXPLAIN_QUERIES:
+        cursor = col(name).find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = cursor.explain().get("queryPlanner", {}).get("winningPlan", {})
+        if "COLLSCAN" in _plan_stages(plan):
+            slow += 1
+            logger.warning(f"🐢 COLLSCAN: {name} {query}")
+        else:
+            logger.info(f"✅ Індекс: {name} {list(query)}")
+    logger.info(f"🔍 Перевірено {len(EXPLAIN_QUERIES)} запитів, без індексу: {slow}")
+
+async def run_db(func, *args, **kwargs):
+    """Виконує синхронний db_* хелпер у пулі потоків, не блокуючи event loop."""
+    loop = asyncio.get_running_loop()
+    call = functools.partial(func, *args, **kwargs)
+    with DB_CALL_SECONDS.labels(func.__name__).time():
+        return await asyncio.wait_for(loop.run_in_executor(db_executor, call), timeout=MONGO_TIMEOUT)
+
+# ─────────────────────────────────────────────
+# КЕШ — версії колекцій
+# ─────────────────────────────────────────────
+def db_get_version(name: str) -> int:
+    doc = col("meta").find_one({"_id": f"version:{name}"})
+    return doc["v"] if doc else 0
+
+def db_bump_version(name: str) -> int:
+    doc = col("meta").find_one_and_update(
+        {"_id": f"version:{name}"}, {"$inc": {"v": 1}},
+        upsert=True, return_document=ReturnDocument.AFTER
+    )
+    return doc["v"]
+
+class CollectionCache:
+    """Словник колекції в пам'яті; після CACHE_TTL звіряє версію з Mongo і перечитує, якщо її змінив інший процес."""
+
+    def __init__(self, name: str, loader):
+        self.name = name
+        self.loader = loader
+        self.data = None
+        self.version = None
+        self.checked = 0.0
+        self.generation = 0    # росте при кожному повному перечитуванні
+        self.lock = threading.Lock()
+
+    def get(self) -> dict:
+        return self.snapshot()[0]
+
+    def snapshot(self) -> tuple:
+        """(дані, покоління) — узгоджена пара для тих, хто будує щось похідне від даних."""
+        with self.lock:
+            now = time.monotonic()
+            if self.data is not None and now - self.checked < CACHE_TTL:
+                return self.data, self.generation
+            version = db_get_version(self.name)
+            if self.data is None or version != self.version:
+                self.data = self.loader()
+                self.version = version
+                self.generation += 1
+            self.checked = now
+            return self.data, self.generation
+
+    def fresh(self) -> bool:
+        """Чи можна віддати дані без звірки версії з Mongo."""
+        return self.data is not None and time.monotonic() - self.checked < CACHE_TTL
+
+    def invalidate(self):
+        """Після власного запису, який не зводиться до apply (вставка/видалення)."""
+        with self.lock:
+            self.data = None
+
+    def apply(self, key: str, fields: dict, version: int, create: bool = True):
+        """Оновлює запис після власного запису в Mongo (copy-on-write — читачі бачать цілісний знімок)."""
+        with self.lock:
+            if self.data is None:
+                return
+            if version != self.version + 1:
+                # Між нашими записами колекцію змінив інший процес — перечитаємо повністю
+                self.data = None
+                return
+            self.version = version
+            if key not in self.data and not create:
+                return
+            data = dict(self.data)
+            data[key] = {**data.get(key, {}), **fields}
+            self.data = data
+
 # ─────────────────────────────────────────────
 # DB HELPERS
 # ─────────────────────────────────────────────
 
+def _with_id(doc: dict) -> dict:
+    """Замінює ObjectId на рядковий "id" — його кладемо в callback_data кнопок."""
+    doc["id"] = str(doc.pop("_id"))
+    return doc
+
+def _content_changed(cache: CollectionCache):
+    """Після зміни колекції: нова версія для інших реплік і скидання власного кешу."""
+    db_bump_version(cache.name)
+    cache.invalidate()
+
+def _delete_by_id(name: str, item_id: str):
+    """Видаляє документ за id одним запитом; повертає видалений документ або None."""
+    try:
+        oid = ObjectId(item_id)
+    except InvalidId:
+        return None
+    return col(name).find_one_and_delete({"_id": oid}, {"_id": 0})
+
+def _bulk_in_batches(name: str, ops, batch: int = 500) -> int:
+    """Записує операції з генератора пачками bulk_write (для міграцій); повертає кількість."""
+    count, chunk = 0, []
+    for op in ops:
+        chunk.append(op)
+        if len(chunk) == batch:
+            col(name).bulk_write(chunk, ordered=False)
+            count, chunk = count + len(chunk), []
+    if chunk:
+        col(name).bulk_write(chunk, ordered=False)
+        count += len(chunk)
+    return count
+
+# ── Групи і розряди ──
+# Кожна група чи розряд — документ у groups з id; учні, батьки, акаунти учнів зберігають group_id/rank_id,
+# розклад, завдання і турніри — group_id цілі (None — для всіх). Назви лишаються в документах лише для показу.
+EVERYONE = ("", "всі", "all")
+
+def group_key(name: str) -> str:
+    """"  Старша  група" і "старша група" — одна група: без зайвих пробілів і регістру."""
+    return " ".join((name or "").split()).casefold()
+
+def db_resolve_group(name: str, kind: str = "group") -> tuple:
+    """Назва → (id, назва як збережена в groups); нову назву додає з типом kind. "Всі"/порожньо → (None, назва).
+
+    Ціль розсилки шукається серед груп і розрядів разом, тож "КМС" у завданні — це розряд КМС.
+    """
+    key = group_key(name)
+    if key in EVERYONE:
+        return None, (name or "").strip()
+    doc = col("groups").find_one({"key": key})
+    if not doc:
+        try:
+            col("groups").insert_one({"key": key, "name": " ".join(name.split()), "kind": kind})
+        except DuplicateKeyError:
+            pass   # ту саму назву щойно додав інший запит
+        doc = col("groups").find_one({"key": key})
+    return str(doc["_id"]), doc["name"]
+
+def db_student_groups(student: dict, resolve=None) -> dict:
+    """Додає учню group_id і rank_id (назви приводяться до збережених у groups)."""
+    resolve = resolve or db_resolve_group
+    student["group_id"], student["group"] = resolve(student.get("group", ""), "group")
+    student["rank_id"], student["rank"] = resolve(student.get("rank", ""), "rank")
+    return student
+
+def student_profile(student: dict = None) -> dict:
+    """Група і розряд учня, які копіюються в записи його батьків і акаунта."""
+    student = student or {}
+    return {"group": student.get("group", ""), "rank": student.get("rank", ""),
+            "group_id": student.get("group_id"), "rank_id": student.get("rank_id")}
+
+def db_ensure_group_ids() -> int:
+    """Міграція: group_id/rank_id за текстовими назвами для документів, збережених до появи groups.
+
+    Спершу учні (створюють групи й розряди), потім цілі розкладу, завдань і турнірів.
+    Раніше ціль збігалась за підрядком ("1" → "1 розряд", "11 розряд"); тепер лише точна назва —
+    цілі, під які не підпадає жоден учень, логуються, щоб тренер їх виправив.
+    """
+    resolve = functools.lru_cache(maxsize=None)(db_resolve_group)
+    updated = 0
+    for name in ("students", "parents", "student_users"):
+        count = _bulk_in_batches(name, (
+            UpdateOne({"_id": doc["_id"]},
+                      {"$set": db_student_groups({"group": doc.get("group", ""), "rank": doc.get("rank", "")}, resolve)})
+            for doc in col(name).find({"group_id": {"$exists": False}}, {"group": 1, "rank": 1})
+        ))
+        if count:
+            db_bump_version(name)
+            updated += count
+    targets = set()
+
+    def target_ops(name: str, field: str):
+        for doc in col(name).find({"group_id": {"$exists": False}}, {field: 1}):
+            group_id, label = resolve(doc.get(field, ""), "group")
+            if group_id:
+                targets.add((group_id, doc.get(field, "")))
+            yield UpdateOne({"_id": doc["_id"]}, {"$set": {"group_id": group_id, field: label}})
+
+    for name, field in (("schedule", "group"), ("homework", "group"), ("tournaments", "for_group")):
+        count = _bulk_in_batches(name, target_ops(name, field))
+        if count:
+            db_bump_version(name)
+            updated += count
+    used = set(col("students").distinct("group_id")) | set(col("students").distinct("rank_id"))
+    for group_id, label in sorted(t for t in targets if t[0] not in used):
+        logger.warning(f"⚠️ Ціль «{label}» не збігається з групою чи розрядом жодного учня")
+    return updated
+
 # ── Учні ──
 def db_get_students() -> list:
-    return list(col("students").find({}, {"_id": 0}))
+    return [_with_id(s) for s in col("students").find({})]
+
+def db_get_student(item_id: str):
+    try:
+        doc = col("students").find_one({"_id": ObjectId(item_id)})
+    except InvalidId:
+        return None
+    return _with_id(doc) if doc else None
 
-def db_add_student(student: dict):
-    col("students").insert_one(deepcopy(student))
+def db_add_student(student: dict) -> str:
+    return str(col("students").insert_one(deepcopy(student)).inserted_id)
 
-def db_delete_student(idx: int):
-    items = db_get_students()
-    if 0 <= idx < len(items):
-        col("students").delete_one({"name": items[idx]["name"]})
+def db_delete_student(item_id: str):
+    return _delete_by_id("students", item_id)
+
+def db_get_page(name: str, sort: list, page: int, size: int) -> tuple:
+    """Одна сторінка колекції (skip/limit на сервері); повертає (документи, чи є наступна)."""
+    docs = list(col(name).find({}).sort(sort).skip(page * size).limit(size + 1))
+    return [_with_id(d) for d in docs[:size]], len(docs) > size
+
+def db_has_documents(name: str) -> bool:
+    return col(name).count_documents({}, limit=1) > 0
+
+def db_ensure_schedule_day_num() -> int:
+    """Додає day_num (для сортування на сервері) заняттям, збереженим до його появи — по update_many на день."""
+    missing = {"day_num": {"$exists": False}}
+    updated = 0
+    for day, num in DAYS_UA_TO_NUM.items():
+        updated += col("schedule").update_many({**missing, "day": day}, {"$set": {"day_num": num}}).modified_count
+    return updated + col("schedule").update_many(missing, {"$set": {"day_num": 9}}).modified_count
 
 def db_find_student_by_phone(phone: str):
     return col("students").find_one({"student_phone": phone}, {"_id": 0})
 
+def _import_lookup(students: list) -> dict:
+    """Наявні учні, яких зачепить пачка імпорту: ключ імпорту (як кортеж) → документ."""
+    phones = [s["student_phone"] for s in students if s.get("student_phone")]
+    pairs = [student_import_key(s) for s in students if not s.get("student_phone")]
+    found = {}
+    for query in ({"student_phone": {"$in": phones}} if phones else None, {"$or": pairs} if pairs else None):
+        if query is None:
+            continue
+        for doc in col("students").find(query, {"name": 1, "group": 1, "rank": 1, "group_id": 1, "rank_id": 1,
+                                                "student_phone": 1, "parent_phone": 1}):
+            if doc.get("student_phone"):
+                found[("student_phone", doc["student_phone"])] = doc
+            found[("name", doc["name"], "parent_phone", doc.get("parent_phone"))] = doc
+    return found
+
+def _import_key_tuple(key: dict) -> tuple:
+    return next(iter(key.items())) if len(key) == 1 else ("name", key["name"], "parent_phone", key["parent_phone"])
+
+def db_sync_linked_profiles(moved: dict) -> int:
+    """Ім'я учня → новий профіль: батьки й акаунти учня тримають власну копію групи/розряду — оновлюємо її.
+
+    Прив'язка йде за ім'ям учня (як у db_link_parent_to_student); повертає кількість оновлених записів.
+    """
+    touched = 0
+    for name, field, uid_field, role, cache in (("parents", "student", "pid", "parent", parents_cache),
+                                                ("student_users", "student_name", "uid", "student",
+                                                 student_users_cache)):
+        linked = {doc[uid_field]: doc[field]
+                  for doc in col(name).find({field: {"$in": list(moved)}}, {uid_field: 1, field: 1})}
+        if not linked:
+            continue
+        col(name).bulk_write([UpdateMany({field: student}, {"$set": profile}) for student, profile in moved.items()],
+                             ordered=False)
+        db_bump_version(name)
+        cache.invalidate()   # нове покоління — AudienceIndex і готові списки перебудуються
+        for uid, student in linked.items():
+            remember_identity(uid, {"role": role, **moved[student]}, create=False)
+        touched += len(linked)
+    return touched
+
+def db_import_students(students: list) -> dict:
+    """Пачка рядків імпорту одним bulk_write: оновлює учня з тим самим телефоном або додає нового.
+
+    Якщо в наявного учня змінилась група чи розряд, те саме переноситься в прив'язаних батьків і акаунти учня.
+    """
+    added = datetime.now().strftime("%d.%m.%Y")
+    resolve = functools.lru_cache(maxsize=None)(db_resolve_group)   # у файлі кілька груп на тисячі рядків
+    if not students:
+        return {"inserted": 0, "updated": 0, "moved": [], "relinked": 0}
+    existing = _import_lookup(students)
+    ops, moved, report = [], {}, []
+    for s in students:
+        row = db_student_groups(dict(s), resolve)
+        key = student_import_key(s)
+        ops.append(UpdateOne(key, {"$set": row, "$setOnInsert": {"added": added}}, upsert=True))
+        old = existing.get(_import_key_tuple(key))
+        if old and (old.get("group_id"), old.get("rank_id")) != (row["group_id"], row["rank_id"]):
+            moved[old["name"]] = student_profile(row)
+            report.append((row["name"], f"{old.get('group', '')}/{old.get('rank', '')}", f"{row['group']}/{row['rank']}"))
+    result = col("students").bulk_write(ops, ordered=False)
+    relinked = db_sync_linked_profiles(moved) if moved else 0
+    return {"inserted": result.upserted_count, "updated": result.matched_count, "moved": report, "relinked": relinked}
+
 # ── Розклад ──
 def db_get_schedule() -> list:
-    return list(col("schedule").find({}, {"_id": 0}))
+    return [_with_id(s) for s in col("schedule").find({})]
+
+schedule_cache = CollectionCache("schedule", db_get_schedule)
 
-def db_add_schedule(entry: dict):
-    col("schedule").insert_one(deepcopy(entry))
+def db_add_schedule(entry: dict) -> str:
+    item_id = str(col("schedule").insert_one(deepcopy(entry)).inserted_id)
+    _content_changed(schedule_cache)   # і лідер на іншій репліці переставить нагадування
+    return item_id
 
-def db_delete_schedule(idx: int):
-    items = db_get_schedule()
-    if 0 <= idx < len(items):
-        item = items[idx]
-        col("schedule").delete_one({"day": item["day"], "time": item["time"], "group": item["group"]})
+def db_delete_schedule(item_id: str):
+    deleted = _delete_by_id("schedule", item_id)
+    if deleted:
+        _content_changed(schedule_cache)
+    return deleted
 
 # ── Домашні завдання ──
+def parse_deadline(text: str, today: datetime = None):
+    """"15.03.2025", "15.03.25" або "15.03" (найближче таке число) → datetime; None, якщо не дата."""
+    today = today or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    text = text.strip().replace("/", ".").replace("-", ".")
+    for fmt in ("%d.%m.%Y", "%d.%m.%y"):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    try:
+        day = datetime.strptime(f"{text}.{today.year}", "%d.%m.%Y")
+    except ValueError:
+        return None
+    return day if day >= today else day.replace(year=today.year + 1)
+
+def _live_homework() -> dict:
+    """Актуальні завдання: дедлайн сьогодні чи пізніше, або старі записи без розпізнаної дати."""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    return {"$or": [{"deadline_at": {"$gte": today}}, {"deadline_at": None}]}
+
 def db_get_homework() -> list:
-    return list(col("homework").find({}, {"_id": 0}))
+    return [_with_id(h) for h in col("homework").find(_live_homework()).sort("deadline_at", 1)]
+
+homework_cache = CollectionCache("homework", db_get_homework)
+
+def db_add_homework(hw: dict) -> str:
+    item_id = str(col("homework").insert_one(deepcopy(hw)).inserted_id)
+    _content_changed(homework_cache)
+    return item_id
 
-def db_add_homework(hw: dict):
-    col("homework").insert_one(deepcopy(hw))
+def db_delete_homework(item_id: str):
+    deleted = _delete_by_id("homework", item_id)
+    if deleted:
+        _content_changed(homework_cache)
+    return deleted
 
-def db_delete_homework(idx: int):
-    items = db_get_homework()
-    if 0 <= idx < len(items):
-        item = items[idx]
-        col("homework").delete_one({"group": item["group"], "task": item["task"]})
+def db_ensure_homework_deadlines() -> int:
+    """Додає deadline_at завданням, збереженим до його появи (нерозпізнана дата → None)."""
+    def ops():
+        for h in col("homework").find({"deadline_at": {"$exists": False}}, {"deadline": 1, "created": 1}):
+            try:
+                created = datetime.strptime(h.get("created", ""), "%d.%m.%Y")
+            except ValueError:
+                created = None
+            yield UpdateOne({"_id": h["_id"]}, {"$set": {"deadline_at": parse_deadline(h.get("deadline", ""), created)}})
+
+    updated = _bulk_in_batches("homework", ops())
+    if updated:
+        _content_changed(homework_cache)
+    return updated
+
+def db_move_to_archive(name: str, query: dict, batch: int) -> list:
+    """Одна пачка: копіює документи під query з name у {name}_archive і видаляє їх; повертає перенесені."""
+    docs = list(col(name).find(query).limit(batch))
+    if docs:
+        now = datetime.utcnow()
+        # Upsert за _id: повторний запуск після збою між вставкою і видаленням не дублює архів
+        col(f"{name}_archive").bulk_write(
+            [ReplaceOne({"_id": d["_id"]}, {**d, "archived_at": now}, upsert=True) for d in docs], ordered=False
+        )
+        col(name).delete_many({"_id": {"$in": [d["_id"] for d in docs]}})
+    return docs
+
+def db_archive_homework_batch(batch: int) -> int:
+    """Пачка завдань з дедлайном до сьогодні — у homework_archive; повертає кількість."""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    moved = len(db_move_to_archive("homework", {"deadline_at": {"$lt": today}}, batch))
+    if moved:
+        _content_changed(homework_cache)
+    return moved
+
+def db_get_homework_due(day: datetime) -> list:
+    return list(col("homework").find({"deadline_at": {"$gte": day, "$lt": day + timedelta(days=1)}}, {"_id": 0})
+                .sort([("group_id", 1), ("deadline_at", 1)]))
 
 # ── Новини ──
-def db_get_news() -> list:
-    return list(col("news").find({}, {"_id": 0}))
+def db_add_news(item: dict) -> str:
+    return str(col("news").insert_one(deepcopy(item)).inserted_id)
 
-def db_add_news(item: dict):
-    col("news").insert_one(deepcopy(item))
+def db_delete_news(item_id: str):
+    return _delete_by_id("news", item_id)
 
-def db_delete_news(idx: int):
-    items = db_get_news()
-    if 0 <= idx < len(items):
-        item = items[idx]
-        col("news").delete_one({"title": item["title"], "date": item["date"]})
+def db_archive_news_batch(days: int, batch: int) -> int:
+    """Пачка новин, старших за days днів, — у news_archive. Вік береться з часу в ObjectId (індекс _id)."""
+    before = ObjectId.from_datetime(datetime.utcnow() - timedelta(days=days))
+    return len(db_move_to_archive("news", {"_id": {"$lt": before}}, batch))
 
 # ── Матеріали ──
 def db_get_materials() -> list:
-    return list(col("materials").find({}, {"_id": 0}))
+    return [_with_id(m) for m in col("materials").find({})]
 
-def db_add_material(mat: dict):
-    col("materials").insert_one(deepcopy(mat))
+def db_add_material(mat: dict) -> str:
+    return str(col("materials").insert_one(deepcopy(mat)).inserted_id)
 
-def db_delete_material(idx: int):
-    items = db_get_materials()
-    if 0 <= idx < len(items):
-        item = items[idx]
-        col("materials").delete_one({"title": item["title"], "link": item["link"]})
+def db_delete_material(item_id: str):
+    return _delete_by_id("materials", item_id)
 
 # ── Турніри ──
 def db_get_tournaments() -> list:
-    return list(col("tournaments").find({}, {"_id": 0}))
+    return [_with_id(t) for t in col("tournaments").find({})]
 
-def db_add_tournament(t: dict):
-    col("tournaments").insert_one(deepcopy(t))
+tournaments_cache = CollectionCache("tournaments", db_get_tournaments)
 
-def db_delete_tournament(idx: int):
-    items = db_get_tournaments()
-    if 0 <= idx < len(items):
-        col("tournaments").delete_one({"title": items[idx]["title"], "date": items[idx]["date"]})
+def db_add_tournament(t: dict) -> str:
+    item_id = str(col("tournaments").insert_one(deepcopy(t)).inserted_id)
+    _content_changed(tournaments_cache)
+    return item_id
+
+def db_delete_tournament(item_id: str):
+    deleted = _delete_by_id("tournaments", item_id)
+    if deleted:
+        _content_changed(tournaments_cache)
+    return deleted
 
 # ── Батьки ──
-def db_get_parents() -> dict:
+def _load_parents() -> dict:
     result = {}
     for p in col("parents").find({}, {"_id": 0}):
         result[p["pid"]] = {
             "name": p["name"],
             "student": p.get("student", ""),
-            "group": p.get("group", ""),       # група учня
-            "rank": p.get("rank", ""),         # розряд учня
+            **student_profile(p),              # група і розряд учня
         }
     return result
 
-def db_upsert_parent(pid: str, name: str, student: str = "", group: str = "", rank: str = ""):
-    col("parents").update_one(
-        {"pid": pid},
-        {"$set": {"pid": pid, "name": name, "student": student, "group": group, "rank": rank}},
-        upsert=True
-    )
+parents_cache = CollectionCache("parents", _load_parents)
 
-def db_link_parent_to_student(pid: str, student_name: str, group: str, rank: str):
-    col("parents").update_one(
-        {"pid": pid},
-        {"$set": {"student": student_name, "group": group, "rank": rank}}
-    )
+def db_get_parents() -> dict:
+    return parents_cache.get()
+
+def db_upsert_parent(pid: str, name: str, student: dict = None):
+    fields = {"name": name, "student": student["name"] if student else "", **student_profile(student)}
+    col("parents").update_one({"pid": pid}, {"$set": {"pid": pid, **fields}}, upsert=True)
+    parents_cache.apply(pid, fields, db_bump_version("parents"))
+    audience_index.move("parent", pid, fields["group_id"], fields["rank_id"])
+    remember_identity(pid, {"role": "parent", **fields})
+
+def db_link_parent_to_student(pid: str, student: dict):
+    fields = {"student": student["name"], **student_profile(student)}
+    col("parents").update_one({"pid": pid}, {"$set": fields})
+    parents_cache.apply(pid, fields, db_bump_version("parents"), create=False)
+    audience_index.move("parent", pid, fields["group_id"], fields["rank_id"])
+    remember_identity(pid, {"role": "parent", **fields}, create=False)
 
 # ── Учні-користувачі (Telegram акаунти учнів) ──
-def db_get_student_users() -> dict:
+def _load_student_users() -> dict:
     result = {}
     for s in col("student_users").find({}, {"_id": 0}):
         result[s["uid"]] = {
             "name": s["name"],
             "student_name": s.get("student_name", ""),
-            "group": s.get("group", ""),
-            "rank": s.get("rank", ""),
+            **student_profile(s),
         }
     return result
 
-def db_upsert_student_user(uid: str, name: str, student_name: str = "", group: str = "", rank: str = ""):
-    col("student_users").update_one(
-        {"uid": uid},
-        {"$set": {"uid": uid, "name": name, "student_name": student_name, "group": group, "rank": rank}},
-        upsert=True
-    )
+student_users_cache = CollectionCache("student_users", _load_student_users)
+
+def db_get_student_users() -> dict:
+    return student_users_cache.get()
+
+def db_upsert_student_user(uid: str, name: str, student: dict = None):
+    fields = {"name": name, "student_name": student["name"] if student else "", **student_profile(student)}
+    col("student_users").update_one({"uid": uid}, {"$set": {"uid": uid, **fields}}, upsert=True)
+    student_users_cache.apply(uid, fields, db_bump_version("student_users"))
+    audience_index.move("student", uid, fields["group_id"], fields["rank_id"])
+    remember_identity(uid, {"role": "student", "name": name, "student": fields["student_name"],
+                            **student_profile(student)})
+
+# ── Хто цей користувач (uid → роль, дитина, група, розряд) ──
+identity_cache = {}
+identity_lock = threading.Lock()
+
+def remember_identity(uid: str, identity: dict, create: bool = True):
+    with identity_lock:
+        cached = identity_cache.get(uid)
+        if cached is None and not create:
+            return
+        if cached is not None and cached[1]["role"] == "student" and identity["role"] == "parent":
+            # Акаунт учня має пріоритет над записом батька (як і в /start)
+            return
+        base = cached[1] if cached else {}
+        identity_cache[uid] = (time.monotonic(), {**base, **identity})
+
+def cached_identity(uid: str):
+    """Роль з кешу без звернення до Mongo; None — треба db_resolve_user."""
+    with identity_lock:
+        cached = identity_cache.get(uid)
+    if cached and time.monotonic() - cached[0] < CACHE_TTL:
+        return cached[1]
+    return None
+
+def db_resolve_user(uid: str):
+    """Визначає роль користувача точковим запитом по унікальному індексу; None — ще не зареєстрований."""
+    cached = cached_identity(uid)
+    if cached:
+        return cached
+    s = col("student_users").find_one({"uid": uid}, {"_id": 0})
+    if s:
+        identity = {"role": "student", "name": s["name"], "student": s.get("student_name", ""),
+                    **student_profile(s)}
+    else:
+        p = col("parents").find_one({"pid": uid}, {"_id": 0})
+        if not p:
+            return None
+        identity = {"role": "parent", "name": p["name"], "student": p.get("student", ""),
+                    **student_profile(p)}
+    with identity_lock:
+        identity_cache[uid] = (time.monotonic(), identity)
+    return identity
+
+# ── Черга повідомлень (outbox) ──
+def db_outbox_enqueue(job: dict, messages: list):
+    now = datetime.utcnow()
+    col("outbox_jobs").insert_one({"_id": job["id"], "title": job["title"], "total": job["total"],
+                                   "report_to": job["report_to"], "created": now,
+                                   "reported": not messages})
+    if messages:
+        col("outbox").insert_many([
+            {"job_id": job["id"], "chat_id": chat_id, "text": text,
+             "status": "pending", "attempts": 0, "next_at": now}
+            for chat_id, text in messages
+        ])
+
+def db_outbox_claim(limit: int) -> list:
+    """Забирає пачку готових до відправки повідомлень (разом із "завислими" після падіння)."""
+    now = datetime.utcnow()
+    ready = {"$or": [
+        {"status": "pending", "next_at": {"$lte": now}},
+        {"status": "sending", "claimed_at": {"$lt": now - timedelta(seconds=OUTBOX_STALE)}},
+    ]}
+    ids = [d["_id"] for d in col("outbox").find(ready, {"_id": 1}).sort("next_at", 1).limit(limit)]
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    col("outbox").update_many({"_id": {"$in": ids}, **ready},
+                              {"$set": {"status": "sending", "claim": token, "claimed_at": now}})
+    return list(col("outbox").find({"claim": token}))
+
+def db_outbox_finish(results: list):
+    """Записує результати [(doc, status), ...]; тимчасові помилки повертаються в чергу з затримкою."""
+    now = datetime.utcnow()
+    ops = []
+    for doc, status in results:
+        attempts = doc.get("attempts", 0) + 1
+        if status == "retry" and attempts < OUTBOX_MAX_ATTEMPTS:
+            delay = min(OUTBOX_BACKOFF * 2 ** (attempts - 1), 600)
+            update = {"status": "pending", "attempts": attempts, "next_at": now + timedelta(seconds=delay)}
+        else:
+            update = {"status": "failed" if status == "retry" else status, "attempts": attempts, "done_at": now}
+        ops.append(UpdateOne({"_id": doc["_id"], "claim": doc["claim"]}, {"$set": update}))
+    if ops:
+        col("outbox").bulk_write(ops, ordered=False)
+
+def db_outbox_completed_jobs(job_ids) -> list:
+    """Завершені розсилки, про які ще не звітували; кожна повертається рівно один раз."""
+    done = []
+    for job_id in set(job_ids):
+        if col("outbox").count_documents({"job_id": job_id, "status": {"$in": ["pending", "sending"]}}, limit=1):
+            continue
+        job = col("outbox_jobs").find_one_and_update({"_id": job_id, "reported": False},
+                                                     {"$set": {"reported": True}})
+        if not job:
+            continue
+        counts = {"sent": 0, "blocked": 0, "failed": 0}
+        for row in col("outbox").aggregate([{"$match": {"job_id": job_id}},
+                                            {"$group": {"_id": "$status", "n": {"$sum": 1}}}]):
+            counts[row["_id"]] = row["n"]
+        done.append({"id": job_id, "ref": job_id[:6], "title": job["title"], "report_to": job.get("report_to"), **counts})
+    return done
+
+def db_outbox_resume() -> int:
+    """Після рестарту повертає в чергу все, що процес не встиг дослати."""
+    return col("outbox").update_many({"status": "sending"}, {"$set": {"status": "pending"}}).modified_count
+
+# ── Лідерство (lease) ──
+def db_acquire_lease(name: str, holder: str, ttl: float) -> bool:
+    """Бере або продовжує lease; False, якщо його тримає інша репліка і він ще не сплив."""
+    now = datetime.utcnow()
+    try:
+        col("leases").update_one(
+            {"_id": name, "$or": [{"holder": holder}, {"expires": {"$lt": now}}]},
+            {"$set": {"holder": holder, "expires": now + timedelta(seconds=ttl)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        return False
+    return True
+
+def db_release_lease(name: str, holder: str):
+    col("leases").delete_one({"_id": name, "holder": holder})
+
+# ── Стан розмов і user_data (persistence) ──
+def db_load_conversations(name: str) -> dict:
+    return {tuple(d["key"]): d["state"] for d in col("conversations").find({"name": name})}
+
+def db_load_user_data(user_id: int) -> dict:
+    doc = col("user_data").find_one({"_id": user_id})
+    # Старі записи (pickle у Binary) не розбираємо: вміст з бази не має виконуватись як код
+    return doc["data"] if doc and isinstance(doc.get("data"), dict) else {}
+
+def bson_safe(value):
+    """Копія user_data, яку можна записати в BSON: множини й кортежі → списки, ключі → рядки."""
+    if isinstance(value, dict):
+        return {str(k): bson_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [bson_safe(v) for v in value]
+    return value
+
+def db_save_persistence(users: dict, conversations: dict):
+    """Одна пачка записів: user_data (None або порожній — видалити) і стани розмов (None — видалити)."""
+    user_ops = [
+        ReplaceOne({"_id": user_id}, {"_id": user_id, "data": data}, upsert=True)
+        if data else DeleteOne({"_id": user_id})
+        for user_id, data in users.items()
+    ]
+    conversation_ops = []
+    for (name, key), state in conversations.items():
+        doc_id = f"{name}:" + ":".join(map(str, key))
+        if state is None:
+            conversation_ops.append(DeleteOne({"_id": doc_id}))
+        else:
+            conversation_ops.append(ReplaceOne({"_id": doc_id}, {"_id": doc_id, "name": name, "key": list(key),
+                                                                 "state": state}, upsert=True))
+    if user_ops:
+        col("user_data").bulk_write(user_ops, ordered=False)
+    if conversation_ops:
+        col("conversations").bulk_write(conversation_ops, ordered=False)
 
 # ── Відвідуваність ──
-def db_get_attendance() -> dict:
-    result = {}
-    for a in col("attendance").find({}, {"_id": 0}):
-        result[a["key"]] = a
-    return result
+def db_get_attendance_page(start, end, page: int, size: int) -> tuple:
+    """Сторінка журналу (новіші спочатку) у межах [start, end); повертає (записи, чи є ще)."""
+    query = {"day": {}}
+    if start:
+        query["day"]["$gte"] = start
+    if end:
+        query["day"]["$lt"] = end
+    if not query["day"]:
+        query = {}
+    cursor = col("attendance").find(query, {"_id": 0}).sort("day", -1).skip(page * size).limit(size + 1)
+    records = list(cursor)
+    return records[:size], len(records) > size
+
+def db_ensure_attendance_days() -> int:
+    """Додає поле day старим записам, у яких дата є лише в ключі "ДД-ММ-РРРР"."""
+    def ops():
+        for a in col("attendance").find({"day": {"$exists": False}}, {"key": 1}):
+            try:
+                day = datetime.strptime(a["key"], "%d-%m-%Y")
+            except (KeyError, ValueError):
+                continue
+            yield UpdateOne({"_id": a["_id"]}, {"$set": {"day": day}})
+
+    return _bulk_in_batches("attendance", ops())
+
+def _attendance_marks(record: dict) -> dict:
+    """Ім'я → "present"/"absent" для одного заняття."""
+    marks = {name: "absent" for name in record.get("absent", [])}
+    marks.update({name: "present" for name in record.get("present", [])})
+    return marks
 
 def db_save_attendance(key: str, record: dict):
     data = deepcopy(record)
     data["key"] = key
-    col("attendance").update_one({"key": key}, {"$set": data}, upsert=True)
+    data["day"] = datetime.strptime(key, "%d-%m-%Y")
+    previous = col("attendance").find_one_and_update(
+        {"key": key}, {"$set": data}, upsert=True, return_document=ReturnDocument.BEFORE
+    )
+    # Лічильники змінюємо на різницю з попереднім записом за цю дату (повторне збереження не подвоює)
+    before = _attendance_marks(previous or {})
+    after = _attendance_marks(data)
+    delta = {}
+    for name in before.keys() | after.keys():
+        for status in ("present", "absent"):
+            change = (after.get(name) == status) - (before.get(name) == status)
+            if change:
+                delta.setdefault(name, {})[status] = change
+    if delta:
+        col("attendance_stats").bulk_write(
+            [UpdateOne({"name": name}, {"$inc": inc}, upsert=True) for name, inc in delta.items()],
+            ordered=False
+        )
+
+def db_get_attendance_stats(name: str) -> dict:
+    doc = col("attendance_stats").find_one({"name": name}, {"_id": 0})
+    return {"present": doc.get("present", 0), "absent": doc.get("absent", 0)} if doc else {"present": 0, "absent": 0}
+
+def db_rollup_attendance_month(month: str):
+    """Підсумки за місяць "РРРР-ММ" по архіву: учень → present/absent.
+
+    Рахуються з нуля і записуються замість попередніх, тож повторний запуск нічого не подвоює.
+    """
+    start = datetime.strptime(month, "%Y-%m")
+    end = (start + timedelta(days=32)).replace(day=1)
+    totals = {}
+    for record in col("attendance_archive").find({"day": {"$gte": start, "$lt": end}},
+                                                 {"_id": 0, "present": 1, "absent": 1}):
+        for name, status in _attendance_marks(record).items():
+            totals.setdefault(name, {"present": 0, "absent": 0})[status] += 1
+    if totals:
+        col("attendance_rollups").bulk_write(
+            [ReplaceOne({"_id": f"{month}:{name}"}, {"month": month, "name": name, **counts}, upsert=True)
+             for name, counts in totals.items()],
+            ordered=False
+        )
+
+def db_archive_attendance_batch(days: int, batch: int) -> int:
+    """Пачка записів журналу, старших за days днів, — в attendance_archive, з оновленням місячних підсумків.
+
+    Лічильники attendance_stats не змінюються: перенесені заняття так само враховані.
+    """
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    docs = db_move_to_archive("attendance", {"day": {"$lt": today - timedelta(days=days)}}, batch)
+    for month in sorted({d["day"].strftime("%Y-%m") for d in docs}):
+        db_rollup_attendance_month(month)
+    return len(docs)
+
+def db_rebuild_attendance_stats() -> int:
+    """Перераховує лічильники: місячні підсумки архіву + записи робочого журналу (міграція, відновлення)."""
+    totals = {}
+    for rollup in col("attendance_rollups").find({}, {"_id": 0}):
+        counts = totals.setdefault(rollup["name"], {"present": 0, "absent": 0})
+        counts["present"] += rollup.get("present", 0)
+        counts["absent"] += rollup.get("absent", 0)
+    for record in col("attendance").find({}, {"_id": 0, "present": 1, "absent": 1}):
+        for name, status in _attendance_marks(record).items():
+            totals.setdefault(name, {"present": 0, "absent": 0})[status] += 1
+    col("attendance_stats").delete_many({})
+    _bulk_in_batches("attendance_stats", (InsertOne({"name": name, **counts}) for name, counts in totals.items()))
+    col("meta").update_one({"_id": "attendance_stats"}, {"$set": {"built": datetime.utcnow()}}, upsert=True)
+    return len(totals)
+
+def db_export_attendance(fh, start, end, fmt: str) -> int:
+    """Пише журнал за [start, end) у fh рядками (дата, учень, група, статус); повертає кількість рядків.
+
+    Записи читаються курсором пачками — у пам'яті лише поточна пачка і словник груп учнів.
+    """
+    groups = {s["name"]: s.get("group", "") for s in col("students").find({}, {"_id": 0, "name": 1, "group": 1})}
+    query = {"day": {}}
+    if start:
+        query["day"]["$gte"] = start
+    if end:
+        query["day"]["$lt"] = end
+    if not query["day"]:
+        query = {}
+
+    # Спершу архів (старші заняття), потім робочий журнал — обидва за зростанням дати.
+    # Архів обрізаємо по першому дню журналу: запис, що завис між колекціями після збою, не повториться.
+    first = col("attendance").find_one({"day": {"$exists": True}}, {"day": 1}, sort=[("day", 1)])
+    archive_query = {"$and": [query, {"day": {"$lt": first["day"]}}]} if first else query
+
+    def rows():
+        fields = {"_id": 0, "key": 1, "date": 1, "present": 1, "absent": 1}
+        for name, part in (("attendance_archive", archive_query), ("attendance", query)):
+            for record in col(name).find(part, fields).sort("day", 1).batch_size(500):
+                date = record.get("date") or record.get("key", "")
+                for student, status in sorted(_attendance_marks(record).items()):
+                    yield [date, student, groups.get(student, ""), "присутній" if status == "present" else "відсутній"]
+
+    with mongo_timeout(EXPORT_TIMEOUT):
+        return write_table(fh, fmt, "Відвідуваність", ["Дата", "Учень", "Група", "Статус"], rows())
+
+def db_export_students(fh, fmt: str) -> int:
+    """Список учнів у форматі, який приймає імпорт."""
+    def rows():
+        for s in col("students").find({}, {"_id": 0}).sort("name", 1).batch_size(500):
+            yield [s.get("name", ""), s.get("rank", ""), s.get("group", ""),
+                   s.get("parent_phone", ""), s.get("student_phone", ""), s.get("added", "")]
+
+    with mongo_timeout(EXPORT_TIMEOUT):
+        return write_table(fh, fmt, "Учні", ["Ім'я", "Розряд", "Група", "Тел.батьків", "Тел.учня", "Додано"], rows())
+
+def db_ensure_attendance_stats():
+    if not col("meta").find_one({"_id": "attendance_stats"}):
+        count = db_rebuild_attendance_stats()
+        logger.info(f"📊 Лічильники відвідуваності перераховано для {count} учнів")
 
 # ─────────────────────────────────────────────
 # HELPERS — групові розсилки
 # ─────────────────────────────────────────────
-def group_matches(user_group: str, user_rank: str, target_group: str) -> bool:
-    """Перевіряє чи підходить користувач під цільову групу розсилки."""
-    if not target_group or target_group.lower() in ("всі", "all", ""):
-        return True
-    target_lower = target_group.lower()
-    return (user_group.lower() == target_lower or
-            user_rank.lower() == target_lower or
-            target_lower in user_group.lower() or
-            target_lower in user_rank.lower())
-
-async def notify_group(context, target_group: str, text: str):
-    """Надсилає повідомлення батькам і учням відповідної групи."""
-    sent = 0
-    # Батьки
-    for pid, info in db_get_parents().items():
-        if group_matches(info.get("group", ""), info.get("rank", ""), target_group):
+def in_group(group_id, rank_id, target_id) -> bool:
+    """Чи адресовано користувачу з такими групою і розрядом: ціль None — для всіх, інакше точний збіг id."""
+    return target_id is None or target_id in (group_id, rank_id)
+
+class AudienceIndex:
+    """id групи чи розряду → chat_id отримувачів.
+
+    Кожен користувач лежить у множинах своєї групи і свого розряду, тож вибірка
+    для розсилки — один пошук у словнику за id цілі.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.built_from = None   # (generation батьків, generation учнів)
+        self.members = {}        # id групи/розряду → {(роль, uid)}
+        self.profile_of = {}     # (роль, uid) → (group_id, rank_id)
+
+    def _place(self, member: tuple, profile: tuple):
+        old = self.profile_of.get(member)
+        if old == profile:
+            return
+        for target in old or ():
+            if target:
+                self.members[target].discard(member)
+        for target in profile:
+            if target:
+                self.members.setdefault(target, set()).add(member)
+        self.profile_of[member] = profile
+
+    def _rebuild(self, parents: dict, student_users: dict):
+        self.members, self.profile_of = {}, {}
+        for pid, info in parents.items():
+            self._place(("parent", pid), (info.get("group_id"), info.get("rank_id")))
+        for uid, info in student_users.items():
+            self._place(("student", uid), (info.get("group_id"), info.get("rank_id")))
+
+    def move(self, role: str, uid: str, group_id, rank_id):
+        """Інкрементальне оновлення після реєстрації чи прив'язки."""
+        with self.lock:
+            if self.built_from is not None:
+                self._place((role, uid), (group_id, rank_id))
+
+    def audience(self, target_id) -> list:
+        parents = parents_cache.get()
+        student_users = student_users_cache.get()
+        with self.lock:
+            source = (parents_cache.generation, student_users_cache.generation)
+            if source != self.built_from:
+                self._rebuild(parents, student_users)
+                self.built_from = source
+            members = self.profile_of if target_id is None else self.members.get(target_id, ())
+            return list({int(uid) for _, uid in members})
+
+audience_index = AudienceIndex()
+
+def db_get_audience(target_id) -> list:
+    return audience_index.audience(target_id)
+
+# ─────────────────────────────────────────────
+# ГОТОВІ ТЕКСТИ ДЛЯ УЧНІВ / БАТЬКІВ
+# ─────────────────────────────────────────────
+def _render_schedule(items: list) -> list:
+    ordered = sorted(items, key=lambda s: DAYS_UA_TO_NUM.get(s["day"], 9))
+    return [f"📌 {s['day']} {s['time']} — {s['group']} ({s['place']})\n" for s in ordered]
+
+def _render_homework(items: list) -> list:
+    return [f"{i}. [{h['group']}] {h['task']}\n   📅 До: {h['deadline']}\n\n" for i, h in enumerate(items, 1)]
+
+def _render_tournaments(items: list) -> list:
+    return [f"{i}. {t['title']}\n   📅 {t['date']}\n   📍 {t['place']}\n"
+            f"   👥 Для: {t.get('for_group','Всі')}\n   ℹ️ {t['info']}\n\n"
+            for i, t in enumerate(items, 1)]
+
+def _split_pages(entries: list) -> list:
+    """Записи → сторінки: не більше PAGE_SIZE записів і PAGE_CHARS символів на сторінці."""
+    pages, page, size = [], [], 0
+    for entry in entries:
+        if page and (len(page) == PAGE_SIZE or size + len(entry) > PAGE_CHARS):
+            pages.append("".join(page))
+            page, size = [], 0
+        page.append(entry)
+        size += len(entry)
+    if page:
+        pages.append("".join(page))
+    return pages
+
+class RenderCache:
+    """(вид, id групи, id розряду) → готовий список, розбитий на сторінки ([] — для групи нічого немає).
+
+    Текст перебудовується лише коли кеш колекції перечитано (нове покоління):
+    після власного запису одразу, після запису іншої репліки — протягом CACHE_TTL.
+    Між звірками версії читання не звертається ні до Mongo, ні до пулу потоків.
+    """
+
+    def __init__(self, views: dict):
+        self.views = views   # вид → (кеш колекції, рендер списку)
+        self.pages = {}      # (вид, група, розряд) → (покоління, сторінки)
+        self.lock = threading.Lock()
+
+    def peek(self, view: str, group_id, rank_id):
+        cache = self.views[view][0]
+        if not cache.fresh():
+            return None
+        hit = self.pages.get((view, group_id, rank_id))
+        return hit[1] if hit and hit[0] == cache.generation else None
+
+    def render(self, view: str, group_id, rank_id) -> list:
+        cache, render = self.views[view]
+        items, generation = cache.snapshot()
+        key = (view, group_id, rank_id)
+        with self.lock:
+            hit = self.pages.get(key)
+            if hit and hit[0] == generation:
+                return hit[1]
+        pages = _split_pages(render([item for item in items if in_group(group_id, rank_id, item.get("group_id"))]))
+        with self.lock:
+            self.pages[key] = (generation, pages)
+        return pages
+
+render_cache = RenderCache({
+    "schedule":    (schedule_cache,    _render_schedule),
+    "homework":    (homework_cache,    _render_homework),
+    "tournaments": (tournaments_cache, _render_tournaments),
+})
+
+async def group_view(view: str, group_id, rank_id) -> list:
+    pages = render_cache.peek(view, group_id, rank_id)
+    if pages is None:
+        pages = await run_db(render_cache.render, view, group_id, rank_id)
+    return pages
+
+class TokenBucket:
+    """Відро токенів: не більше rate відправок за секунду, пауза після RetryAfter."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        while True:
+            now = time.monotonic()
+            if now < self.paused_until:
+                await asyncio.sleep(self.paused_until - now)
+                continue
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class BroadcastEngine:
+    """Розсилки через outbox у Mongo: фоновий цикл відправляє з обмеженою паралельністю і лімітами Telegram."""
+
+    def __init__(self):
+        self.bucket = TokenBucket(BROADCAST_RATE)
+        self.semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+        self.chat_next = {}   # chat_id → коли можна писати в цей чат наступного разу
+        self.wakeup = asyncio.Event()
+        self.worker = None
+
+    async def submit(self, messages: list, title: str, report_to: int = None) -> dict:
+        """Ставить розсилку [(chat_id, text), ...] у outbox і одразу повертає її id."""
+        # Повний uuid — ключ у outbox_jobs (короткий за 30 днів зберігання міг би повторитись),
+        # ref — його початок для повідомлень тренеру і логів
+        job_id = uuid.uuid4().hex
+        job = {"id": job_id, "ref": job_id[:6], "title": title, "total": len(messages), "report_to": report_to}
+        await run_db(db_outbox_enqueue, job, messages)
+        BROADCAST_QUEUED.inc(len(messages))
+        self.wakeup.set()
+        return job
+
+    def start(self, bot):
+        if self.worker is None or self.worker.done():
+            self.worker = asyncio.get_running_loop().create_task(self.run(bot))
+
+    async def stop(self):
+        if self.worker:
+            self.worker.cancel()
+            self.worker = None
+
+    async def run(self, bot):
+        """Фоновий цикл: забирає з outbox готові повідомлення, надсилає, записує результат."""
+        while True:
             try:
-                await context.bot.send_message(chat_id=int(pid), text=text)
-                sent += 1
-            except Exception:
-                pass
-    # Учні
-    for uid, info in db_get_student_users().items():
-        if group_matches(info.get("group", ""), info.get("rank", ""), target_group):
+                if not leader.is_leader:
+                    # Lease сплив, а продовжити не вдалося — не шлемо, поки лідерство не підтверджено
+                    await asyncio.sleep(LEASE_RENEW)
+                    continue
+                self.wakeup.clear()
+                batch = await run_db(db_outbox_claim, OUTBOX_BATCH)
+                if not batch:
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), timeout=OUTBOX_POLL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                statuses = await asyncio.gather(*(self.send(bot, d["chat_id"], d["text"]) for d in batch))
+                for status in statuses:
+                    BROADCAST_MESSAGES.labels(status).inc()
+                await run_db(db_outbox_finish, list(zip(batch, statuses)))
+                for job in await run_db(db_outbox_completed_jobs, [d["job_id"] for d in batch]):
+                    await self._report(bot, job)
+                now = time.monotonic()
+                self.chat_next = {c: t for c, t in self.chat_next.items() if t > now}
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Outbox: {e}")
+                await asyncio.sleep(OUTBOX_POLL)
+
+    async def _report(self, bot, job: dict):
+        logger.info(f"📨 Розсилка #{job['ref']} ({job['title']}): надіслано {job['sent']}, "
+                    f"заблоковано {job['blocked']}, помилок {job['failed']}")
+        if job["report_to"]:
             try:
-                await context.bot.send_message(chat_id=int(uid), text=text)
-                sent += 1
-            except Exception:
+                await bot.send_message(
+                    chat_id=job["report_to"],
+                    text=f"📊 Розсилку #{job['ref']} завершено ({job['title']})\n"
+                         f"📨 Надіслано: {job['sent']}\n"
+                         f"🚫 Заблокували бота: {job['blocked']}\n"
+                         f"❌ Не вдалося: {job['failed']}"
+                )
+            except TelegramError:
                 pass
-    return sent
 
-async def notify_all(context, text: str):
+    async def _wait_chat(self, chat_id: int):
+        now = time.monotonic()
+        ready = self.chat_next.get(chat_id, 0.0)
+        self.chat_next[chat_id] = max(now, ready) + PER_CHAT_INTERVAL
+        if ready > now:
+            await asyncio.sleep(ready - now)
+
+    async def send(self, bot, chat_id: int, text: str, **kwargs) -> str:
+        """Одна спроба доставки: "sent", "blocked", "failed" або "retry" (тимчасова помилка)."""
+        async with self.semaphore:
+            for _ in range(5):
+                await self._wait_chat(chat_id)
+                await self.bucket.acquire()
+                try:
+                    await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+                    return "sent"
+                except RetryAfter as e:
+                    BROADCAST_PAUSES.inc()
+                    self.bucket.pause(e.retry_after)
+                except Forbidden:
+                    return "blocked"
+                except BadRequest:
+                    return "failed"
+                except NetworkError:
+                    return "retry"
+                except TelegramError:
+                    return "failed"
+            return "retry"
+
+broadcaster = BroadcastEngine()
+
+@timed
+async def notify_group(context, group_id, text: str, report_to: int = None, label: str = "") -> dict:
+    """Ставить у фон розсилку батькам і учням групи (чи розряду) з id group_id; None — всім."""
+    chat_ids = await run_db(db_get_audience, group_id)
+    title = f"група {label or group_id}" if group_id else "всі"
+    return await broadcaster.submit([(chat_id, text) for chat_id in chat_ids], title, report_to)
+
+async def notify_all(context, text: str, report_to: int = None) -> dict:
     """Надсилає всім батькам і учням."""
-    return await notify_group(context, "", text)
+    return await notify_group(context, None, text, report_to)
 
 # ─────────────────────────────────────────────
 # ПЕРЕВІРКА РОЛІ
@@ -268,7 +1441,8 @@ def back_to_keyboard(label: str):
 def students_keyboard():
     return ReplyKeyboardMarkup([
         ["➕ Додати учня",   "🗑 Видалити учня"],
-        ["📄 Показати всіх", "⬅️ Головне меню"],
+        ["📄 Показати всіх", "📥 Імпорт з файлу"],
+        ["⬅️ Головне меню"],
     ], resize_keyboard=True)
 
 def schedule_keyboard():
@@ -304,7 +1478,8 @@ def chat_keyboard():
 def attendance_keyboard():
     return ReplyKeyboardMarkup([
         ["📝 Відмітити відвідуваність", "📊 Статистика відвідуваності"],
-        ["📋 Журнал за датою",           "⬅️ Головне меню"],
+        ["📋 Журнал за датою",           "📤 Експорт у файл"],
+        ["⬅️ Головне меню"],
     ], resize_keyboard=True)
 
 def tournaments_keyboard():
@@ -340,35 +1515,281 @@ def role_keyboard():
 # ─────────────────────────────────────────────
 DAYS_UA_TO_NUM = {"Пн": 0, "Вт": 1, "Ср": 2, "Чт": 3, "Пт": 4, "Сб": 5, "Нд": 6}
 
-async def send_reminders(context: ContextTypes.DEFAULT_TYPE):
-    """Щогодини перевіряє розклад і надсилає нагадування за 2 год ТІЛЬКИ своїй групі."""
-    now = datetime.now()
-    total_now_mins = now.hour * 60 + now.minute
-    for lesson in db_get_schedule():
-        day_num = DAYS_UA_TO_NUM.get(lesson.get("day"), -1)
-        if day_num != now.weekday():
-            continue
-        try:
-            h, m = map(int, lesson["time"].split(":"))
-        except Exception:
+def next_lesson_at(lesson: dict, after: datetime):
+    """Найближчий після `after` початок щотижневого заняття або None, якщо день/час не розпізнано."""
+    day_num = DAYS_UA_TO_NUM.get(lesson.get("day"))
+    try:
+        h, m = map(int, lesson["time"].split(":"))
+        start = after.replace(hour=h, minute=m, second=0, microsecond=0)
+    except (KeyError, ValueError):
+        return None
+    if day_num is None:
+        return None
+    start += timedelta(days=(day_num - after.weekday()) % 7)
+    if start <= after:
+        start += timedelta(days=7)
+    return start
+
+def reminder_at(lesson: dict, lead: float, after: datetime):
+    """Момент нагадування (UTC) за lead годин до найближчого заняття, що починається пізніше after + lead.
+
+    Початок заняття рахується за місцевим часом у TIMEZONE, а lead віднімається в реальних годинах,
+    тож через ніч переходу на літній/зимовий час нагадування не зсувається.
+    """
+    start = next_lesson_at(lesson, (after + timedelta(hours=lead)).astimezone(TIMEZONE))
+    return None if start is None else start.astimezone(timezone.utc) - timedelta(hours=lead)
+
+def hours_label(hours: float) -> str:
+    if hours != int(hours):
+        return f"{hours:g} год."
+    n = int(hours)
+    if n % 10 == 1 and n % 100 != 11:
+        return f"{n} годину"
+    if 2 <= n % 10 <= 4 and not 12 <= n % 100 <= 14:
+        return f"{n} години"
+    return f"{n} годин"
+
+def reminder_job_name(lesson: dict, lead: float) -> str:
+    return f"reminder:{lesson['id']}:{lead:g}"
+
+def schedule_lesson_reminders(job_queue, lesson: dict) -> bool:
+    """Ставить по одному job на кожен REMINDER_LEADS точно на час нагадування."""
+    now = datetime.now(timezone.utc)
+    scheduled = False
+    for lead in REMINDER_LEADS:
+        when = reminder_at(lesson, lead, now)
+        if when is None:
+            return False
+        name = reminder_job_name(lesson, lead)
+        for job in job_queue.get_jobs_by_name(name):
+            job.schedule_removal()
+        job_queue.run_once(send_lesson_reminder, when=when, data={"lesson": lesson, "lead": lead}, name=name)
+        scheduled = True
+    return scheduled
+
+def unschedule_lesson_reminders(job_queue, lesson: dict):
+    for lead in REMINDER_LEADS:
+        for job in job_queue.get_jobs_by_name(reminder_job_name(lesson, lead)):
+            job.schedule_removal()
+
+def unschedule_all_reminders(job_queue):
+    for job in job_queue.jobs():
+        if job.name and job.name.startswith("reminder:"):
+            job.schedule_removal()
+
+@timed
+async def send_lesson_reminder(context: ContextTypes.DEFAULT_TYPE):
+    """Надсилає нагадування про заняття ТІЛЬКИ своїй групі і ставить таке ж на наступний тиждень."""
+    if not leader.is_leader:
+        return   # нове лідерство поставить нагадування заново
+    lesson, lead = context.job.data["lesson"], context.job.data["lead"]
+    group = lesson.get("group", "")
+    msg = (
+        f"⏰ Нагадування!\n\nЧерез {hours_label(lead)} заняття з шахів!\n"
+        f"👥 Група: {group}\n"
+        f"🕐 Час: {lesson['time']}\n"
+        f"📍 Місце: {lesson.get('place', '')}\n\n"
+        f"Не забудьте! ♟️"
+    )
+    try:
+        job = await notify_group(context, lesson.get("group_id"), msg, label=group)
+        if job["total"] > 0:
+            logger.info(f"Нагадування #{job['ref']} для групи {group}: {job['total']} отримувачів")
+    finally:
+        when = reminder_at(lesson, lead, datetime.now(timezone.utc) + timedelta(minutes=1))
+        context.job_queue.run_once(send_lesson_reminder, when=when, data=context.job.data, name=context.job.name)
+
+async def schedule_all_reminders(app: Application):
+    """Читає розклад і ставить нагадування для всіх занять (коли репліка стає лідером або розклад змінено)."""
+    count = 0
+    for lesson in await run_db(db_get_schedule):
+        if schedule_lesson_reminders(app.job_queue, lesson):
+            count += 1
+    logger.info(f"⏰ Нагадування заплановано для {count} занять")
+
+# ── Домашні завдання: архів і дедлайни ──
+async def archive_expired_homework():
+    """Як apply_retention: по одній пачці на run_db, з паузами і перевіркою лідерства перед кожною."""
+    moved = 0
+    while leader.is_leader:
+        count = await run_db(db_archive_homework_batch, ARCHIVE_BATCH)
+        moved += count
+        if count < ARCHIVE_BATCH:
+            break
+        await asyncio.sleep(ARCHIVE_PAUSE)
+    if moved:
+        logger.info(f"🗄 В архів перенесено {moved} завдань з минулим дедлайном")
+
+async def archive_homework_job(context: ContextTypes.DEFAULT_TYPE):
+    if leader.is_leader:
+        await archive_expired_homework()
+
+@timed
+async def send_deadline_reminders(context: ContextTypes.DEFAULT_TYPE):
+    """Щовечора: завдання з дедлайном завтра — одне повідомлення на групу, лише цій групі."""
+    if not leader.is_leader:
+        return
+    tomorrow = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)
+    by_group = {}
+    for hw in await run_db(db_get_homework_due, tomorrow):
+        by_group.setdefault(hw.get("group_id"), []).append(hw)
+    for group_id, tasks in by_group.items():
+        group = tasks[0].get("group", "")
+        msg = (f"⏰ Завтра ({tomorrow:%d.%m}) дедлайн домашнього завдання!\n\n👥 Група: {group}\n\n"
+               + "".join(f"📝 {hw['task']}\n" for hw in tasks))
+        job = await notify_group(context, group_id, msg, label=group)
+        logger.info(f"Нагадування про дедлайн #{job['ref']} для групи {group}: {job['total']} отримувачів")
+
+def schedule_homework_jobs(job_queue):
+    job_queue.run_daily(archive_homework_job, dtime(0, 5, tzinfo=TIMEZONE), name="homework:archive")
+    job_queue.run_daily(send_deadline_reminders, dtime(HOMEWORK_REMINDER_HOUR, 0, tzinfo=TIMEZONE),
+                        name="homework:deadlines")
+    # Прострочене, поки лідера не було, — окремою задачею, а не всередині _take_over
+    job_queue.run_once(archive_homework_job, when=5, name="homework:catchup")
+
+def unschedule_homework_jobs(job_queue):
+    for name in ("homework:archive", "homework:deadlines", "homework:catchup"):
+        for job in job_queue.get_jobs_by_name(name):
+            job.schedule_removal()
+
+# ── Ретеншн: старі новини і журнал — в архів ──
+async def apply_retention():
+    """Переносить застарілі документи пачками з паузами, щоб не забирати базу в обробників апдейтів.
+
+    Перевіряє лідерство перед кожною пачкою: при втраті lease зупиняється, решту доробить новий лідер.
+    """
+    for name, days, move_batch in (("news", NEWS_RETENTION_DAYS, db_archive_news_batch),
+                                   ("attendance", ATTENDANCE_RETENTION_DAYS, db_archive_attendance_batch)):
+        if not days:
             continue
-        diff = (h * 60 + m) - total_now_mins
-        if 115 <= diff <= 125:
-            group = lesson.get("group", "")
-            msg = (
-                f"⏰ Нагадування!\n\nЧерез 2 години заняття з шахів!\n"
-                f"👥 Група: {group}\n"
-                f"🕐 Час: {lesson['time']}\n"
-                f"📍 Місце: {lesson.get('place', '')}\n\n"
-                f"Не забудьте! ♟️"
-            )
-            sent = await notify_group(context, group, msg)
-            if sent > 0:
-                logger.info(f"Нагадування надіслано {sent} людям для групи {group}")
+        moved = 0
+        while leader.is_leader:
+            count = await run_db(move_batch, days, ARCHIVE_BATCH)
+            moved += count
+            if count < ARCHIVE_BATCH:
+                break
+            await asyncio.sleep(ARCHIVE_PAUSE)
+        if moved:
+            logger.info(f"🗄 {name}: в архів перенесено {moved} документів старших за {days} днів")
+
+async def retention_job(context: ContextTypes.DEFAULT_TYPE):
+    if leader.is_leader:
+        await apply_retention()
+
+def schedule_retention_jobs(job_queue):
+    job_queue.run_daily(retention_job, dtime(0, 15, tzinfo=TIMEZONE), name="retention:daily")
+    # Перший прогін одразу після перехоплення lease, але окремою задачею — не затримує продовження lease
+    job_queue.run_once(retention_job, when=5, name="retention:catchup")
+
+def unschedule_retention_jobs(job_queue):
+    for name in ("retention:daily", "retention:catchup"):
+        for job in job_queue.get_jobs_by_name(name):
+            job.schedule_removal()
+
+# ─────────────────────────────────────────────
+# ЛІДЕР — фонові задачі лише на одній репліці
+# ─────────────────────────────────────────────
+class LeaderLease:
+    """Lease у Mongo: лідер виконує нагадування і розсилки з outbox, решта реплік лише обробляють апдейти.
+
+    Лідер продовжує lease кожні LEASE_RENEW секунд. Якщо він впав, інша репліка
+    перехоплює lease не пізніше ніж за LEASE_TTL; при зупинці lease звільняється одразу.
+    Лідером репліка вважається лише після успішного _take_over; якщо він упав — відкат і повтор
+    на наступному проході.
+
+    Обмеження: lease захищає лише фонові задачі. Апдейти має отримувати одна репліка —
+    два процеси з polling отримають 409 Conflict від Telegram, а webhook за балансувальником
+    розділить стан розмов (get_conversations читається лише при старті). Тобто друга репліка —
+    це гарячий резерв і безпечний rolling restart, а не горизонтальне масштабування обробки.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.holder = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.holding = False           # lease у Mongo наш (останнє продовження вдалося)
+        self.leading = False           # _take_over завершено — фонові задачі запущено
+        self.valid_until = 0.0         # monotonic: доки lease гарантовано наш
+        self.schedule_version = None   # версія розкладу, за якою поставлено нагадування
+        self.task = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self.leading and time.monotonic() < self.valid_until
+
+    async def renew(self) -> bool:
+        asked = time.monotonic()   # відлік від моменту запиту — з запасом на час відповіді
+        if await run_db(db_acquire_lease, self.name, self.holder, LEASE_TTL):
+            self.valid_until = asked + LEASE_TTL
+            self.holding = True
+            return True
+        return False
+
+    def start(self, app: Application):
+        self.task = asyncio.get_running_loop().create_task(self.run(app))
+
+    async def stop(self, app: Application):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.holding:
+            await self._step_down(app)
+            try:
+                await run_db(db_release_lease, self.name, self.holder)
+            except Exception as e:
+                logger.warning(f"⚠️ Lease: {e}")
+
+    async def run(self, app: Application):
+        while True:
+            try:
+                if await self.renew():
+                    if not self.leading:
+                        await self._take_over(app)
+                    await self._sync_reminders(app)
+                elif self.holding:
+                    await self._step_down(app)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"⚠️ Lease: {e}")
+                # Недороблене перехоплення відкочуємо — наступний прохід почне його заново
+                if self.holding and not self.is_leader:
+                    await self._step_down(app)
+            await asyncio.sleep(LEASE_RENEW)
+
+    async def _take_over(self, app: Application):
+        logger.info(f"👑 Лідер: {self.holder}")
+        # Попередній лідер зупинився або не продовжив lease — дошлемо те, що він не встиг
+        resumed = await run_db(db_outbox_resume)
+        if resumed:
+            logger.info(f"📨 Відновлено {resumed} недоставлених повідомлень з outbox")
+        broadcaster.start(app.bot)
+        schedule_homework_jobs(app.job_queue)
+        schedule_retention_jobs(app.job_queue)
+        self.schedule_version = None
+        self.leading = True
+
+    async def _sync_reminders(self, app: Application):
+        version = await run_db(db_get_version, "schedule")
+        if version != self.schedule_version:
+            unschedule_all_reminders(app.job_queue)
+            await schedule_all_reminders(app)
+            self.schedule_version = version
+
+    async def _step_down(self, app: Application):
+        logger.info(f"🔕 Більше не лідер: {self.holder}")
+        self.holding = self.leading = False
+        await broadcaster.stop()
+        unschedule_all_reminders(app.job_queue)
+        unschedule_homework_jobs(app.job_queue)
+        unschedule_retention_jobs(app.job_queue)
+        self.schedule_version = None
+
+leader = LeaderLease("scheduler")
 
 # ─────────────────────────────────────────────
 # /start — ВИБІР РОЛІ
 # ─────────────────────────────────────────────
+@timed
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
 
@@ -379,17 +1800,16 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return MAIN_MENU
 
-    if str(user.id) in db_get_student_users():
-        info = db_get_student_users()[str(user.id)]
+    info = await run_db(db_resolve_user, str(user.id))
+    if info and info["role"] == "student":
         await update.message.reply_text(
-            f"♟️ Вітаємо, {info['student_name']}!\n"
+            f"♟️ Вітаємо, {info['student']}!\n"
             f"👥 Група: {info.get('group','')} | 🏅 Розряд: {info.get('rank','')}",
             reply_markup=student_keyboard()
         )
         return STUDENT_MENU
 
-    if str(user.id) in db_get_parents():
-        info = db_get_parents()[str(user.id)]
+    if info and info["role"] == "parent":
         await update.message.reply_text(
             f"👋 Вітаємо, {user.first_name}!\n"
             f"👤 Дитина: {info.get('student') or 'ще не прив`язано'}",
@@ -406,6 +1826,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ─────────────────────────────────────────────
 # ВИБІР РОЛІ
 # ─────────────────────────────────────────────
+@timed
 async def choose_role(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     user = update.effective_user
@@ -419,7 +1840,7 @@ async def choose_role(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return REGISTER_STUDENT
 
     elif text == "👨‍👩‍👦 Я батько/мати":
-        db_upsert_parent(str(user.id), user.full_name)
+        await run_db(db_upsert_parent, str(user.id), user.full_name)
         await update.message.reply_text(
             "✅ Ви зареєстровані як батько/мати!\n\n"
             "Тренер прив'яже вас до вашої дитини.\n"
@@ -433,6 +1854,7 @@ async def choose_role(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ─────────────────────────────────────────────
 # РЕЄСТРАЦІЯ УЧНЯ ЗА ТЕЛЕФОНОМ
 # ─────────────────────────────────────────────
+@timed
 async def register_student(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text.strip()
     user = update.effective_user
@@ -441,7 +1863,7 @@ async def register_student(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Оберіть роль:", reply_markup=role_keyboard())
         return CHOOSE_ROLE
 
-    student = db_find_student_by_phone(text)
+    student = await run_db(db_find_student_by_phone, text)
     if not student:
         await update.message.reply_text(
             "❌ Номер телефону не знайдено в базі.\n\n"
@@ -450,12 +1872,7 @@ async def register_student(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return REGISTER_STUDENT
 
-    db_upsert_student_user(
-        str(user.id), user.full_name,
-        student["name"],
-        student.get("group", ""),
-        student.get("rank", "")
-    )
+    await run_db(db_upsert_student_user, str(user.id), user.full_name, student)
     await update.message.reply_text(
         f"✅ Вітаємо, {student['name']}!\n\n"
         f"👥 Ваша група: {student.get('group', '—')}\n"
@@ -468,6 +1885,7 @@ async def register_student(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ─────────────────────────────────────────────
 # МЕНЮ УЧНЯ
 # ─────────────────────────────────────────────
+@timed
 async def student_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if is_trainer(update):
         await update.message.reply_text("Меню тренера:", reply_markup=main_keyboard())
@@ -475,46 +1893,24 @@ async def student_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYP
 
     text = update.message.text
     uid = str(update.effective_user.id)
-    info = db_get_student_users().get(uid, {})
-    student_name = info.get("student_name", "")
+    info = cached_identity(uid) or await run_db(db_resolve_user, uid) or {}
+    student_name = info.get("student", "")
     student_group = info.get("group", "")
     student_rank = info.get("rank", "")
 
     if text == "📅 Розклад занять":
-        schedule = db_get_schedule()
-        # Показуємо тільки заняття своєї групи
-        my_schedule = [s for s in schedule if group_matches(student_group, student_rank, s.get("group", ""))]
-        if not my_schedule:
-            await update.message.reply_text("📭 Занять для вашої групи не знайдено.", reply_markup=student_keyboard())
-        else:
-            days_order = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Нд"]
-            sorted_s = sorted(my_schedule, key=lambda x: days_order.index(x["day"]) if x["day"] in days_order else 9)
-            msg = f"📅 Розклад для групи {student_group}:\n\n" + "".join(
-                f"📌 {s['day']} {s['time']} — {s['group']} ({s['place']})\n" for s in sorted_s)
-            await update.message.reply_text(msg, reply_markup=student_keyboard())
+        # Тільки заняття своєї групи — готові сторінки з кешу
+        await send_group_page(update, "schedule", "student", info, student_keyboard())
 
     elif text == "📚 Домашні завдання":
-        homework = db_get_homework()
-        # Тільки своя група
-        my_hw = [h for h in homework if group_matches(student_group, student_rank, h.get("group", ""))]
-        if not my_hw:
-            await update.message.reply_text("📭 Домашніх завдань для вашої групи немає.", reply_markup=student_keyboard())
-        else:
-            msg = f"📚 Домашні завдання для групи {student_group}:\n\n"
-            for i, h in enumerate(my_hw, 1):
-                msg += f"{i}. [{h['group']}] {h['task']}\n   📅 До: {h['deadline']}\n\n"
-            await update.message.reply_text(msg, reply_markup=student_keyboard())
+        await send_group_page(update, "homework", "student", info, student_keyboard())
 
     elif text == "✅ Моя відвідуваність":
         if not student_name:
             await update.message.reply_text("⚠️ Помилка. Зверніться до тренера.", reply_markup=student_keyboard())
             return STUDENT_MENU
-        present_count = absent_count = 0
-        for record in db_get_attendance().values():
-            if student_name in record.get("present", []):
-                present_count += 1
-            elif student_name in record.get("absent", []):
-                absent_count += 1
+        counts = await run_db(db_get_attendance_stats, student_name)
+        present_count, absent_count = counts["present"], counts["absent"]
         total = present_count + absent_count
         percent = round(present_count / total * 100) if total > 0 else 0
         await update.message.reply_text(
@@ -528,34 +1924,18 @@ async def student_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYP
         )
 
     elif text == "🎓 Навчальні матеріали":
-        materials = db_get_materials()
-        if not materials:
-            await update.message.reply_text("📭 Матеріалів ще немає.", reply_markup=student_keyboard())
-        else:
-            msg = "🎓 Навчальні матеріали:\n\n"
-            for i, m in enumerate(materials, 1):
-                msg += f"{i}. {m['title']}\n   🔗 {m['link']}\n   📁 {m['category']}\n\n"
-            await update.message.reply_text(msg, reply_markup=student_keyboard())
+        await send_page(update, "materials", student_keyboard())
 
     elif text == "🏆 Турніри":
-        tournaments = db_get_tournaments()
-        # Показуємо турніри для своєї групи + турніри для всіх
-        my_tournaments = [t for t in tournaments
-                          if group_matches(student_group, student_rank, t.get("for_group", ""))]
-        if not my_tournaments:
-            await update.message.reply_text("📭 Турнірів для вашої групи немає.", reply_markup=student_keyboard())
-        else:
-            msg = "🏆 Турніри для вашої групи:\n\n"
-            for i, t in enumerate(my_tournaments, 1):
-                for_who = t.get("for_group", "Всі")
-                msg += f"{i}. {t['title']}\n   📅 {t['date']}\n   📍 {t['place']}\n   👥 Для: {for_who}\n   ℹ️ {t['info']}\n\n"
-            await update.message.reply_text(msg, reply_markup=student_keyboard())
+        # Турніри для своєї групи + турніри для всіх
+        await send_group_page(update, "tournaments", "student", info, student_keyboard())
 
     return STUDENT_MENU
 
 # ─────────────────────────────────────────────
 # МЕНЮ БАТЬКІВ
 # ─────────────────────────────────────────────
+@timed
 async def parent_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if is_trainer(update):
         await update.message.reply_text("Меню тренера:", reply_markup=main_keyboard())
@@ -563,34 +1943,15 @@ async def parent_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
 
     text = update.message.text
     user_id = str(update.effective_user.id)
-    parent_info = db_get_parents().get(user_id, {})
+    parent_info = cached_identity(user_id) or await run_db(db_resolve_user, user_id) or {}
     parent_group = parent_info.get("group", "")
     parent_rank = parent_info.get("rank", "")
 
     if text == "📅 Розклад занять":
-        schedule = db_get_schedule()
-        my_schedule = [s for s in schedule if group_matches(parent_group, parent_rank, s.get("group", ""))]
-        if not my_schedule:
-            await update.message.reply_text("📭 Розклад для вашої групи ще не додано.", reply_markup=parent_keyboard())
-        else:
-            days_order = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Нд"]
-            sorted_s = sorted(my_schedule, key=lambda x: days_order.index(x["day"]) if x["day"] in days_order else 9)
-            child = parent_info.get("student", "")
-            msg = f"📅 Розклад занять{f' ({child})' if child else ''}:\n\n" + "".join(
-                f"📌 {s['day']} {s['time']} — {s['group']} ({s['place']})\n" for s in sorted_s)
-            await update.message.reply_text(msg, reply_markup=parent_keyboard())
+        await send_group_page(update, "schedule", "parent", parent_info, parent_keyboard())
 
     elif text == "📚 Домашні завдання":
-        homework = db_get_homework()
-        my_hw = [h for h in homework if group_matches(parent_group, parent_rank, h.get("group", ""))]
-        if not my_hw:
-            await update.message.reply_text("📭 Домашніх завдань для вашої групи немає.", reply_markup=parent_keyboard())
-        else:
-            child = parent_info.get("student", "")
-            msg = f"📚 Домашні завдання{f' ({child})' if child else ''}:\n\n"
-            for i, h in enumerate(my_hw, 1):
-                msg += f"{i}. [{h['group']}] {h['task']}\n   📅 До: {h['deadline']}\n\n"
-            await update.message.reply_text(msg, reply_markup=parent_keyboard())
+        await send_group_page(update, "homework", "parent", parent_info, parent_keyboard())
 
     elif text == "✅ Відвідуваність дитини":
         student_name = parent_info.get("student", "")
@@ -600,12 +1961,8 @@ async def parent_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
                 reply_markup=parent_keyboard()
             )
             return PARENT_MENU
-        present_count = absent_count = 0
-        for record in db_get_attendance().values():
-            if student_name in record.get("present", []):
-                present_count += 1
-            elif student_name in record.get("absent", []):
-                absent_count += 1
+        counts = await run_db(db_get_attendance_stats, student_name)
+        present_count, absent_count = counts["present"], counts["absent"]
         total = present_count + absent_count
         percent = round(present_count / total * 100) if total > 0 else 0
         await update.message.reply_text(
@@ -618,26 +1975,18 @@ async def parent_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE
         )
 
     elif text == "🏆 Турніри":
-        tournaments = db_get_tournaments()
-        my_tournaments = [t for t in tournaments
-                          if group_matches(parent_group, parent_rank, t.get("for_group", ""))]
-        if not my_tournaments:
-            await update.message.reply_text("📭 Турнірів для вашої групи немає.", reply_markup=parent_keyboard())
-        else:
-            msg = "🏆 Турніри:\n\n"
-            for i, t in enumerate(my_tournaments, 1):
-                msg += f"{i}. {t['title']}\n   📅 {t['date']}\n   📍 {t['place']}\n   👥 Для: {t.get('for_group','Всі')}\n   ℹ️ {t['info']}\n\n"
-            await update.message.reply_text(msg, reply_markup=parent_keyboard())
+        await send_group_page(update, "tournaments", "parent", parent_info, parent_keyboard())
 
     return PARENT_MENU
 
 # ─────────────────────────────────────────────
 # ГОЛОВНЕ МЕНЮ ТРЕНЕРА
 # ─────────────────────────────────────────────
+@timed
 async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_trainer(update):
-        uid = str(update.effective_user.id)
-        if uid in db_get_student_users():
+        info = await run_db(db_resolve_user, str(update.effective_user.id))
+        if info and info["role"] == "student":
             await update.message.reply_text("Ваше меню:", reply_markup=student_keyboard())
             return STUDENT_MENU
         await update.message.reply_text("Ваше меню:", reply_markup=parent_keyboard())
@@ -660,8 +2009,9 @@ async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("🎓 Навчальні матеріали:", reply_markup=materials_keyboard())
         return MATERIALS_MENU
     elif text == "💬 Чат з батьками":
+        parents = await run_db(db_get_parents)
         await update.message.reply_text(
-            f"💬 Комунікація з батьками\n👥 Зареєстровано батьків: {len(db_get_parents())}",
+            f"💬 Комунікація з батьками\n👥 Зареєстровано батьків: {len(parents)}",
             reply_markup=chat_keyboard()
         )
         return CHAT_MENU
@@ -673,9 +2023,146 @@ async def main_menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return TOURNAMENTS_MENU
     return MAIN_MENU
 
+# ─────────────────────────────────────────────
+# ПАГІНАЦІЯ СПИСКІВ
+# ─────────────────────────────────────────────
+def _stats_line(n: int, s: dict) -> str:
+    present, absent = s.get("present", 0), s.get("absent", 0)
+    total = present + absent
+    pct = round(present / total * 100) if total > 0 else 0
+    return f"👤 {s['name']}\n   ✅ {present} | ❌ {absent} | 📊 {pct}%\n\n"
+
+# Текстові списки: колекція, сортування, заголовок, текст для порожнього списку, рядок для запису
+LIST_VIEWS = {
+    "students": ("students", [("name", 1)], "📋 Список учнів", "📭 Список учнів порожній.",
+                 lambda n, s: f"{n}. {s['name']}\n"
+                              f"   🏅 {s.get('rank','—')} | 👥 {s.get('group','—')}\n"
+                              f"   👨‍👩‍👦 {s.get('parent_phone','—')} | 📱 {s.get('student_phone','—')}\n\n"),
+    "schedule": ("schedule", [("day_num", 1), ("_id", 1)], "📅 Розклад занять", "📭 Розклад порожній.",
+                 lambda n, s: f"📌 {s['day']} {s['time']} — {s['group']} ({s['place']})\n"),
+    "homework": ("homework", [("deadline_at", 1), ("_id", 1)], "📚 Домашні завдання", "📭 Завдань немає.",
+                 lambda n, h: f"{n}. [{h['group']}] {h['task']}\n   📅 До: {h['deadline']}\n\n"),
+    "news": ("news", [("_id", 1)], "📢 Новини", "📭 Новин немає.",
+             lambda n, item: f"{n}. {item['title']}\n   {item['text']}\n   📅 {item['date']}\n\n"),
+    "materials": ("materials", [("_id", 1)], "🎓 Навчальні матеріали", "📭 Матеріалів немає.",
+                  lambda n, m: f"{n}. {m['title']}\n   🔗 {m['link']}\n   📁 {m['category']}\n\n"),
+    "tournaments": ("tournaments", [("_id", 1)], "🏆 Турніри", "📭 Турнірів немає.",
+                    lambda n, t: f"{n}. {t['title']}\n"
+                                 f"   📅 {t['date']} | 📍 {t['place']}\n"
+                                 f"   👥 Для: {t.get('for_group', 'Всі')}\n"
+                                 f"   ℹ️ {t['info']}\n\n"),
+    "parents": ("parents", [("name", 1)], "👥 Зареєстровані батьки", "📭 Жоден батько ще не зареєструвався.",
+                lambda n, p: f"• {p['name']}\n  👤 {p.get('student','—')} | 👥 {p.get('group','—')}\n\n"),
+    "attstats": ("attendance_stats", [("name", 1)], "📊 Статистика відвідуваності", "📭 Даних ще немає.",
+                 _stats_line),
+}
+
+# Списки кнопок: колекція, сортування, підпис, текст для порожнього списку, (текст кнопки, callback_data)
+BUTTON_VIEWS = {
+    "dstudent": ("students", [("name", 1)], "Оберіть учня для видалення:", "Список порожній.",
+                 lambda s, arg: (f"{s['name']} ({s.get('group','?')})", f"del_student_{s['id']}")),
+    "dschedule": ("schedule", [("day_num", 1), ("_id", 1)], "Оберіть заняття для видалення:", "Розклад порожній.",
+                  lambda s, arg: (f"{s['day']} {s['time']} — {s['group']}", f"del_schedule_{s['id']}")),
+    "dhomework": ("homework", [("deadline_at", 1), ("_id", 1)], "Оберіть завдання для видалення:", "Завдань немає.",
+                  lambda h, arg: (f"[{h['group']}] {h['task'][:25]}...", f"del_hw_{h['id']}")),
+    "dnews": ("news", [("_id", 1)], "Оберіть новину для видалення:", "Новин немає.",
+              lambda n, arg: (n["title"], f"del_news_{n['id']}")),
+    "dmaterial": ("materials", [("_id", 1)], "Оберіть матеріал для видалення:", "Матеріалів немає.",
+                  lambda m, arg: (m["title"], f"del_material_{m['id']}")),
+    "dtournament": ("tournaments", [("_id", 1)], "Оберіть турнір для видалення:", "Турнірів немає.",
+                    lambda t, arg: (f"{t['title']} ({t.get('for_group','Всі')})", f"del_tournament_{t['id']}")),
+    "lparent": ("parents", [("name", 1)], "Оберіть батька для прив'язки:", "📭 Батьків немає.",
+                lambda p, arg: (f"{p['name']} → {p.get('student','—')}", f"link_parent_{p['pid']}")),
+    "lstudent": ("students", [("name", 1)], "Оберіть учня:", "📭 Спочатку додайте учнів.",
+                 lambda s, pid: (f"{s['name']} ({s.get('group','?')})", f"link_student_{pid}_{s['id']}")),
+}
+
+def fit_message(msg: str) -> str:
+    return msg if len(msg) <= MESSAGE_LIMIT else msg[:MESSAGE_LIMIT - 1] + "…"
+
+def page_nav(view: str, page: int, has_more: bool, arg: str = "") -> list:
+    suffix = f"_{arg}" if arg else ""
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("◀️", callback_data=f"pg_{view}_{page - 1}{suffix}"))
+    if has_more:
+        nav.append(InlineKeyboardButton("▶️", callback_data=f"pg_{view}_{page + 1}{suffix}"))
+    return nav
+
+async def render_page(view: str, page: int, arg: str = "", header: str = "") -> tuple:
+    """Текст і inline-клавіатура однієї сторінки; клавіатура None, якщо навігація не потрібна."""
+    if view in LIST_VIEWS:
+        name, sort, title, empty, line = LIST_VIEWS[view]
+        docs, has_more = await run_db(db_get_page, name, sort, page, PAGE_SIZE)
+        if not docs:
+            return empty, None
+        pages = f" — стор. {page + 1}" if page or has_more else ""
+        msg = f"{title}{pages}:\n\n" + "".join(line(page * PAGE_SIZE + i, d) for i, d in enumerate(docs, 1))
+        nav = page_nav(view, page, has_more, arg)
+        return fit_message(msg), InlineKeyboardMarkup([nav]) if nav else None
+    name, sort, title, empty, button = BUTTON_VIEWS[view]
+    docs, has_more = await run_db(db_get_page, name, sort, page, BUTTON_PAGE)
+    if not docs:
+        return empty, None
+    keyboard = []
+    for d in docs:
+        label, callback_data = button(d, arg)
+        keyboard.append([InlineKeyboardButton(label, callback_data=callback_data)])
+    nav = page_nav(view, page, has_more, arg)
+    if nav:
+        keyboard.append(nav)
+    return f"{header}{title}", InlineKeyboardMarkup(keyboard)
+
+async def send_page(update: Update, view: str, menu_markup, arg: str = "", header: str = ""):
+    """Надсилає першу сторінку; якщо вона єдина — зі звичайною клавіатурою меню."""
+    msg, markup = await render_page(view, 0, arg, header)
+    await update.message.reply_text(msg, reply_markup=markup or menu_markup)
+
+def _child(info: dict) -> str:
+    return f" ({info['student']})" if info.get("student") else ""
+
+# Готові списки для учнів і батьків: вид → роль → (заголовок за профілем, текст для порожнього списку)
+GROUP_VIEW_TEXTS = {
+    "schedule": {
+        "student": (lambda info: f"📅 Розклад для групи {info.get('group', '')}",
+                    "📭 Занять для вашої групи не знайдено."),
+        "parent": (lambda info: f"📅 Розклад занять{_child(info)}", "📭 Розклад для вашої групи ще не додано."),
+    },
+    "homework": {
+        "student": (lambda info: f"📚 Домашні завдання для групи {info.get('group', '')}",
+                    "📭 Домашніх завдань для вашої групи немає."),
+        "parent": (lambda info: f"📚 Домашні завдання{_child(info)}", "📭 Домашніх завдань для вашої групи немає."),
+    },
+    "tournaments": {
+        "student": (lambda info: "🏆 Турніри для вашої групи", "📭 Турнірів для вашої групи немає."),
+        "parent": (lambda info: "🏆 Турніри", "📭 Турнірів для вашої групи немає."),
+    },
+}
+
+async def render_group_page(view: str, role: str, info: dict, page: int = 0) -> tuple:
+    """Сторінка готового списку групи учня/батька; навігація — кнопки pg_my<вид>_<сторінка>."""
+    title, empty = GROUP_VIEW_TEXTS[view]["parent" if role == "parent" else "student"]
+    pages = await group_view(view, info.get("group_id"), info.get("rank_id"))
+    if not pages:
+        return empty, None
+    page = min(max(page, 0), len(pages) - 1)   # список міг скоротитися, поки користувач гортав
+    suffix = f" — стор. {page + 1}/{len(pages)}" if len(pages) > 1 else ""
+    nav = page_nav(f"my{view}", page, page + 1 < len(pages))
+    return fit_message(f"{title(info)}{suffix}:\n\n{pages[page]}"), InlineKeyboardMarkup([nav]) if nav else None
+
+async def send_group_page(update: Update, view: str, role: str, info: dict, menu_markup):
+    """Перша сторінка; якщо вона єдина — зі звичайною клавіатурою меню (як send_page)."""
+    msg, markup = await render_group_page(view, role, info)
+    await update.message.reply_text(msg, reply_markup=markup or menu_markup)
+
+async def link_header(pid: str) -> str:
+    parent = await run_db(db_resolve_user, pid)
+    return f"👤 Батько: {parent['name'] if parent else '?'}\n\n"
+
 # ─────────────────────────────────────────────
 # УЧНІ (ТРЕНЕР)
 # ─────────────────────────────────────────────
+@timed
 async def students_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_trainer(update): return ConversationHandler.END
     text = update.message.text
@@ -683,16 +2170,7 @@ async def students_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Головне меню:", reply_markup=main_keyboard())
         return MAIN_MENU
     elif text == "📄 Показати всіх":
-        students = db_get_students()
-        if not students:
-            await update.message.reply_text("📭 Список учнів порожній.", reply_markup=students_keyboard())
-        else:
-            msg = "📋 Список учнів:\n\n"
-            for i, s in enumerate(students, 1):
-                msg += (f"{i}. {s['name']}\n"
-                        f"   🏅 {s.get('rank','—')} | 👥 {s.get('group','—')}\n"
-                        f"   👨‍👩‍👦 {s.get('parent_phone','—')} | 📱 {s.get('student_phone','—')}\n\n")
-            await update.message.reply_text(msg, reply_markup=students_keyboard())
+        await send_page(update, "students", students_keyboard())
     elif text == "➕ Додати учня":
         await update.message.reply_text(
             "Введіть дані учня у форматі:\n"
@@ -704,16 +2182,19 @@ async def students_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return ADD_STUDENT
     elif text == "🗑 Видалити учня":
-        students = db_get_students()
-        if not students:
-            await update.message.reply_text("Список порожній.", reply_markup=students_keyboard())
-            return STUDENTS_MENU
-        keyboard = [[InlineKeyboardButton(
-            f"{s['name']} ({s.get('group','?')})", callback_data=f"del_student_{i}"
-        )] for i, s in enumerate(students)]
-        await update.message.reply_text("Оберіть учня для видалення:", reply_markup=InlineKeyboardMarkup(keyboard))
+        await send_page(update, "dstudent", students_keyboard())
+    elif text == "📥 Імпорт з файлу":
+        await update.message.reply_text(
+            "Надішліть файл <b>.csv</b> або <b>.xlsx</b> зі стовпцями:\n"
+            "<b>Ім'я | Розряд | Група | Тел.батьків | Тел.учня</b>\n\n"
+            "💡 Рядок заголовків необов'язковий — якщо він є, порядок стовпців може бути будь-яким\n"
+            "💡 Учня з уже відомим телефоном буде оновлено, а не додано вдруге",
+            parse_mode="HTML", reply_markup=back_to_keyboard("списку учнів")
+        )
+        return IMPORT_STUDENTS
     return STUDENTS_MENU
 
+@timed
 async def add_student(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     if text == "⬅️ Головне меню":
@@ -734,7 +2215,8 @@ async def add_student(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "student_phone": parts[4] if len(parts) > 4 else "",
             "added":         datetime.now().strftime("%d.%m.%Y")
         }
-        db_add_student(student)
+        await run_db(db_student_groups, student)
+        await run_db(db_add_student, student)
         msg = (f"✅ Учня {student['name']} успішно додано!\n\n"
                f"🏅 Розряд: {student['rank']}\n"
                f"👥 Група: {student['group']}\n")
@@ -750,9 +2232,243 @@ async def add_student(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
     return STUDENTS_MENU
 
+# ─────────────────────────────────────────────
+# ЕКСПОРТ У CSV / XLSX
+# ─────────────────────────────────────────────
+def write_table(fh, fmt: str, title: str, header: list, rows) -> int:
+    """Пише рядки з ітератора у бінарний fh як CSV (";" і BOM — для Excel) або XLSX у режимі write_only."""
+    count = 0
+    if fmt == "xlsx":
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet(title)
+        sheet.append(header)
+        for row in rows:
+            sheet.append(row)
+            count += 1
+        workbook.save(fh)
+        return count
+    text = io.TextIOWrapper(fh, encoding="utf-8-sig", newline="")
+    writer = csv.writer(text, delimiter=";")
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    text.flush()
+    text.detach()
+    return count
+
+def export_keyboard() -> InlineKeyboardMarkup:
+    keyboard = [[InlineKeyboardButton(f"📋 {label} · {fmt.upper()}", callback_data=f"exp_att_{code}_{fmt}")
+                 for fmt in ("csv", "xlsx")]
+                for code, label in JOURNAL_RANGES.items()]
+    keyboard.append([InlineKeyboardButton(f"👦 Учні · {fmt.upper()}", callback_data=f"exp_students_a_{fmt}")
+                     for fmt in ("csv", "xlsx")])
+    return InlineKeyboardMarkup(keyboard)
+
+async def send_export(context, chat_id: int, what: str, range_code: str, fmt: str):
+    """Фонова задача: готує файл і надсилає документом; помилку повідомляє тренеру."""
+    try:
+        await _send_export(context, chat_id, what, range_code, fmt)
+    except Exception as e:
+        logger.warning(f"⚠️ Експорт {what}_{range_code}.{fmt}: {e}")
+        await context.bot.send_message(chat_id=chat_id, text=f"❌ Експорт не вдався: {e}")
+
+async def _send_export(context, chat_id: int, what: str, range_code: str, fmt: str):
+    """Готує файл у пулі потоків Mongo (event loop вільний) і надсилає його документом."""
+    loop = asyncio.get_running_loop()
+    with tempfile.SpooledTemporaryFile(max_size=EXPORT_SPOOL) as fh:
+        if what == "students":
+            rows = await loop.run_in_executor(db_executor, db_export_students, fh, fmt)
+            filename, caption = f"students.{fmt}", f"👦 Учні: {rows}"
+        else:
+            start, end = journal_bounds(range_code)
+            rows = await loop.run_in_executor(db_executor, db_export_attendance, fh, start, end, fmt)
+            filename = f"attendance_{range_code}.{fmt}"
+            caption = f"📋 Журнал ({journal_title(range_code, start, end)}): {rows} відміток"
+        if not rows:
+            await context.bot.send_message(chat_id=chat_id, text="📭 Даних для експорту немає.")
+            return
+        fh.seek(0)
+        # Байти, а не сам файл: у SpooledTemporaryFile до скидання на диск name=None, і PTB на ньому падає;
+        # вміст PTB однаково читає в пам'ять цілком перед відправкою
+        await context.bot.send_document(chat_id=chat_id, document=fh.read(), filename=filename, caption=caption)
+    logger.info(f"📤 Експорт {filename}: {rows} рядків")
+
+# ─────────────────────────────────────────────
+# ІМПОРТ УЧНІВ З CSV / XLSX
+# ─────────────────────────────────────────────
+IMPORT_FIELDS = ["name", "rank", "group", "parent_phone", "student_phone"]
+IMPORT_HEADERS = {
+    "ім'я": "name", "імя": "name", "піб": "name", "name": "name",
+    "розряд": "rank", "rank": "rank",
+    "група": "group", "group": "group",
+    "тел.батьків": "parent_phone", "телефон батьків": "parent_phone", "parent_phone": "parent_phone",
+    "тел.учня": "student_phone", "телефон учня": "student_phone", "student_phone": "student_phone",
+}
+
+def normalize_phone(phone: str) -> str:
+    return "".join(ch for ch in phone if ch not in " -()")
+
+def student_import_key(student: dict) -> dict:
+    """Чим ідентифікується учень при імпорті: телефон учня, а без нього — ім'я і телефон батьків."""
+    if student.get("student_phone"):
+        return {"student_phone": student["student_phone"]}
+    return {"name": student["name"], "parent_phone": student["parent_phone"]}
+
+def _cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)   # телефон, збережений у Excel як число
+    return str(value).strip()
+
+def _file_rows(fh, kind: str):
+    """Рядки файлу по одному, не читаючи весь файл у пам'ять."""
+    if kind == "xlsx":
+        workbook = load_workbook(fh, read_only=True, data_only=True)
+        try:
+            for row in workbook.active.iter_rows(values_only=True):
+                yield [_cell(v) for v in row]
+        finally:
+            workbook.close()
+        return
+    head = fh.read(65536)
+    fh.seek(0)
+    try:
+        sample = head.decode("utf-8-sig")
+        encoding = "utf-8-sig"
+    except UnicodeDecodeError as e:
+        if e.start < len(head) - 3:
+            sample, encoding = head.decode("cp1251", errors="replace"), "cp1251"
+        else:
+            # Багатобайтовий символ обрізано на межі зразка
+            sample, encoding = head[:e.start].decode("utf-8-sig"), "utf-8-sig"
+    # Роздільник — той, якого найбільше в першому рядку (Excel з українською локаллю пише ";")
+    first_line = sample.splitlines()[0] if sample else ""
+    delimiter = max(",;|\t", key=first_line.count)
+    text = io.TextIOWrapper(fh, encoding=encoding, newline="")
+    try:
+        for row in csv.reader(text, delimiter=delimiter):
+            yield [_cell(v) for v in row]
+    finally:
+        text.detach()
+
+def _parse_student(row: list, columns: list):
+    """Рядок файлу → (учень, None) або (None, причина відмови)."""
+    values = dict(zip(columns, row))
+    student = {field: values.get(field, "") for field in IMPORT_FIELDS}
+    student["parent_phone"] = normalize_phone(student["parent_phone"])
+    student["student_phone"] = normalize_phone(student["student_phone"])
+    if not student["name"]:
+        return None, "немає імені"
+    if not student["group"]:
+        return None, "немає групи"
+    if not student["parent_phone"]:
+        return None, "немає телефону батьків"
+    for field in ("parent_phone", "student_phone"):
+        phone = student[field]
+        if phone and not (phone.lstrip("+").isdigit() and 9 <= len(phone.lstrip("+")) <= 15):
+            return None, f"некоректний телефон {phone}"
+    return student, None
+
+def read_student_file(fh, kind: str) -> tuple:
+    """Перевіряє файл рядок за рядком; повертає (учні без дублів, [(номер рядка, причина), ...])."""
+    students, rejected, seen = [], [], {}
+    columns = None
+    for line, row in enumerate(_file_rows(fh, kind), 1):
+        if not any(row):
+            continue
+        if columns is None:
+            columns = IMPORT_FIELDS
+            header = [IMPORT_HEADERS.get(v.lower()) for v in row]
+            if any(header):
+                columns = [field or "" for field in header]
+                continue
+        if len(students) + len(rejected) >= IMPORT_MAX_ROWS:
+            rejected.append((line, f"перевищено ліміт {IMPORT_MAX_ROWS} рядків, решту файлу пропущено"))
+            break
+        student, error = _parse_student(row, columns)
+        if error:
+            rejected.append((line, error))
+            continue
+        key = tuple(sorted(student_import_key(student).items()))
+        if key in seen:
+            rejected.append((line, f"дублікат рядка {seen[key]}"))
+            continue
+        seen[key] = line
+        students.append(student)
+    return students, rejected
+
+@timed
+async def import_students(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_trainer(update): return ConversationHandler.END
+    message = update.message
+    if message.text == "⬅️ Головне меню":
+        await message.reply_text("Головне меню:", reply_markup=main_keyboard())
+        return MAIN_MENU
+    if message.text == "⬅️ До списку учнів":
+        await message.reply_text("👦 Управління учнями:", reply_markup=students_keyboard())
+        return STUDENTS_MENU
+    document = message.document
+    file_name = (document.file_name or "").lower() if document else ""
+    kind = "xlsx" if file_name.endswith(".xlsx") else "csv" if file_name.endswith((".csv", ".txt")) else None
+    if not kind:
+        await message.reply_text("📎 Надішліть файл .csv або .xlsx (старий формат .xls не підтримується).",
+                                 reply_markup=back_to_keyboard("списку учнів"))
+        return IMPORT_STUDENTS
+
+    # Завантаження, розбір і запис тисяч рядків — окремою задачею, звіт прийде повідомленням
+    await message.reply_text("⏳ Файл отримано, імпортую — звіт надійде окремим повідомленням.",
+                             reply_markup=students_keyboard())
+    context.application.create_task(run_import(context, message.chat_id, document, kind), update=update)
+    return STUDENTS_MENU
+
+async def run_import(context, chat_id: int, document, kind: str):
+    """Фонова задача імпорту; будь-яку помилку повідомляє тренеру."""
+    try:
+        msg = await _import_file(document, kind)
+    except Exception as e:
+        logger.warning(f"⚠️ Імпорт {document.file_name}: {e}")
+        msg = f"❌ Не вдалося імпортувати файл: {e}"
+    await context.bot.send_message(chat_id=chat_id, text=fit_message(msg))
+
+async def _import_file(document, kind: str) -> str:
+    started = time.monotonic()
+    with tempfile.SpooledTemporaryFile(max_size=1 << 20) as fh:
+        await (await document.get_file()).download_to_memory(fh)
+        fh.seek(0)
+        students, rejected = await asyncio.get_running_loop().run_in_executor(None, read_student_file, fh, kind)
+
+    inserted = updated = relinked = 0
+    moved = []
+    for i in range(0, len(students), IMPORT_BATCH):
+        result = await run_db(db_import_students, students[i:i + IMPORT_BATCH])
+        inserted += result["inserted"]
+        updated += result["updated"]
+        moved += result["moved"]
+        relinked += result["relinked"]
+    logger.info(f"📥 Імпорт {document.file_name}: +{inserted}, ♻️ {updated} (🔀 {len(moved)}), ❌ {len(rejected)} "
+                f"за {time.monotonic() - started:.1f} с")
+
+    msg = (f"📥 Імпорт завершено\n\n"
+           f"➕ Додано: {inserted}\n"
+           f"♻️ Оновлено: {updated}\n"
+           f"🔀 Змінили групу чи розряд: {len(moved)} (оновлено батьків і акаунтів учнів: {relinked})\n"
+           f"❌ Відхилено: {len(rejected)}")
+    if moved:
+        msg += "\n\n" + "\n".join(f"🔀 {name}: {old} → {new}" for name, old, new in moved[:20])
+        if len(moved) > 20:
+            msg += f"\n… і ще {len(moved) - 20}"
+    if rejected:
+        msg += "\n\n" + "\n".join(f"Рядок {line}: {reason}" for line, reason in rejected[:20])
+        if len(rejected) > 20:
+            msg += f"\n… і ще {len(rejected) - 20}"
+    return msg
+
 # ─────────────────────────────────────────────
 # РОЗКЛАД
 # ─────────────────────────────────────────────
+@timed
 async def schedule_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_trainer(update): return ConversationHandler.END
     text = update.message.text
@@ -760,15 +2476,7 @@ async def schedule_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Головне меню:", reply_markup=main_keyboard())
         return MAIN_MENU
     elif text == "📋 Показати розклад":
-        schedule = db_get_schedule()
-        if not schedule:
-            await update.message.reply_text("📭 Розклад порожній.", reply_markup=schedule_keyboard())
-        else:
-            days_order = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Нд"]
-            sorted_s = sorted(schedule, key=lambda x: days_order.index(x["day"]) if x["day"] in days_order else 9)
-            msg = "📅 Розклад занять:\n\n" + "".join(
-                f"📌 {s['day']} {s['time']} — {s['group']} ({s['place']})\n" for s in sorted_s)
-            await update.message.reply_text(msg, reply_markup=schedule_keyboard())
+        await send_page(update, "schedule", schedule_keyboard())
     elif text == "➕ Додати заняття":
         await update.message.reply_text(
             "Введіть заняття у форматі:\n<b>День | Час | Група | Місце</b>\n\n"
@@ -778,16 +2486,10 @@ async def schedule_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return ADD_SCHEDULE
     elif text == "🗑 Видалити заняття":
-        schedule = db_get_schedule()
-        if not schedule:
-            await update.message.reply_text("Розклад порожній.", reply_markup=schedule_keyboard())
-            return SCHEDULE_MENU
-        keyboard = [[InlineKeyboardButton(
-            f"{s['day']} {s['time']} — {s['group']}", callback_data=f"del_schedule_{i}"
-        )] for i, s in enumerate(schedule)]
-        await update.message.reply_text("Оберіть заняття для видалення:", reply_markup=InlineKeyboardMarkup(keyboard))
+        await send_page(update, "dschedule", schedule_keyboard())
     return SCHEDULE_MENU
 
+@timed
 async def add_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     if text == "⬅️ Головне меню":
@@ -800,11 +2502,19 @@ async def add_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parts = [p.strip() for p in text.split("|")]
         if len(parts) < 4:
             raise ValueError(f"Потрібно 4 поля")
-        entry = {"day": parts[0], "time": parts[1], "group": parts[2], "place": parts[3]}
-        db_add_schedule(entry)
+        group_id, group = await run_db(db_resolve_group, parts[2])
+        entry = {"day": parts[0], "time": parts[1], "group": group, "group_id": group_id, "place": parts[3],
+                 "day_num": DAYS_UA_TO_NUM.get(parts[0], 9)}
+        entry["id"] = await run_db(db_add_schedule, entry)
+        if next_lesson_at(entry, datetime.now(TIMEZONE)) is not None:
+            if leader.is_leader:
+                schedule_lesson_reminders(context.job_queue, entry)
+            reminder_note = "🔔 Нагадування отримають тільки учні/батьки цієї групи."
+        else:
+            reminder_note = "⚠️ Нагадування не налаштовано: день має бути Пн…Нд, час — ГГ:ХХ."
         await update.message.reply_text(
             f"✅ Заняття {entry['day']} {entry['time']} для групи {entry['group']} додано!\n"
-            f"🔔 Нагадування отримають тільки учні/батьки цієї групи.",
+            f"{reminder_note}",
             reply_markup=schedule_keyboard()
         )
     except Exception as e:
@@ -817,6 +2527,7 @@ async def add_schedule(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ─────────────────────────────────────────────
 # ДОМАШНІ ЗАВДАННЯ
 # ─────────────────────────────────────────────
+@timed
 async def homework_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_trainer(update): return ConversationHandler.END
     text = update.message.text
@@ -824,33 +2535,21 @@ async def homework_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Головне меню:", reply_markup=main_keyboard())
         return MAIN_MENU
     elif text == "📋 Показати завдання":
-        homework = db_get_homework()
-        if not homework:
-            await update.message.reply_text("📭 Завдань немає.", reply_markup=homework_keyboard())
-        else:
-            msg = "📚 Домашні завдання:\n\n"
-            for i, h in enumerate(homework, 1):
-                msg += f"{i}. [{h['group']}] {h['task']}\n   📅 До: {h['deadline']}\n\n"
-            await update.message.reply_text(msg, reply_markup=homework_keyboard())
+        await send_page(update, "homework", homework_keyboard())
     elif text == "➕ Задати домашнє":
         await update.message.reply_text(
             "Введіть завдання у форматі:\n<b>Група | Завдання | Дедлайн</b>\n\n"
-            "Приклад: 1-2 розряд | Вивчити захист Філідора | 15.03.2025\n\n"
+            "Приклад: 1-2 розряд | Вивчити захист Філідора | 15.03\n"
+            "Дедлайн — ДД.ММ (найближча така дата) або ДД.ММ.РРРР\n\n"
             "💡 Сповіщення отримають тільки учні/батьки цієї групи",
             parse_mode="HTML", reply_markup=back_to_keyboard("завдань")
         )
         return ADD_HOMEWORK
     elif text == "🗑 Видалити завдання":
-        homework = db_get_homework()
-        if not homework:
-            await update.message.reply_text("Завдань немає.", reply_markup=homework_keyboard())
-            return HOMEWORK_MENU
-        keyboard = [[InlineKeyboardButton(
-            f"[{h['group']}] {h['task'][:25]}...", callback_data=f"del_hw_{i}"
-        )] for i, h in enumerate(homework)]
-        await update.message.reply_text("Оберіть завдання для видалення:", reply_markup=InlineKeyboardMarkup(keyboard))
+        await send_page(update, "dhomework", homework_keyboard())
     return HOMEWORK_MENU
 
+@timed
 async def add_homework(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     if text == "⬅️ Головне меню":
@@ -863,16 +2562,24 @@ async def add_homework(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parts = [p.strip() for p in text.split("|")]
         if len(parts) < 3:
             raise ValueError("Потрібно 3 поля")
-        hw = {"group": parts[0], "task": parts[1], "deadline": parts[2],
-              "created": datetime.now().strftime("%d.%m.%Y")}
-        db_add_homework(hw)
+        deadline_at = parse_deadline(parts[2])
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        # Минулий дедлайн одразу сховався б від учнів і пішов в архів о 00:05
+        if deadline_at is None or deadline_at < today:
+            raise ValueError(f"Дедлайн «{parts[2]}» — не майбутня дата ДД.ММ.РРРР або ДД.ММ")
+        group_id, group = await run_db(db_resolve_group, parts[0])
+        hw = {"group": group, "group_id": group_id, "task": parts[1], "deadline": f"{deadline_at:%d.%m.%Y}",
+              "deadline_at": deadline_at, "created": datetime.now().strftime("%d.%m.%Y")}
+        await run_db(db_add_homework, hw)
         notify_text = (f"📚 Нове домашнє завдання!\n\n"
                        f"👥 Група: {hw['group']}\n"
                        f"📝 {hw['task']}\n"
                        f"📅 До: {hw['deadline']}")
-        sent = await notify_group(context, hw["group"], notify_text)
+        job = await notify_group(context, hw["group_id"], notify_text, report_to=update.effective_chat.id,
+                                 label=hw["group"])
         await update.message.reply_text(
-            f"✅ Завдання для групи {hw['group']} додано!\n📨 Надіслано {sent} повідомлень.",
+            f"✅ Завдання для групи {hw['group']} додано!\n"
+            f"📨 Розсилка #{job['ref']}: {job['total']} отримувачів, звіт надійде після завершення.",
             reply_markup=homework_keyboard()
         )
     except Exception as e:
@@ -885,6 +2592,7 @@ async def add_homework(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ─────────────────────────────────────────────
 # НОВИНИ
 # ─────────────────────────────────────────────
+@timed
 async def news_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_trainer(update): return ConversationHandler.END
     text = update.message.text
@@ -892,14 +2600,7 @@ async def news_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Головне меню:", reply_markup=main_keyboard())
         return MAIN_MENU
     elif text == "📋 Показати новини":
-        news = db_get_news()
-        if not news:
-            await update.message.reply_text("📭 Новин немає.", reply_markup=news_keyboard())
-        else:
-            msg = "📢 Новини:\n\n"
-            for i, n in enumerate(news, 1):
-                msg += f"{i}. {n['title']}\n   {n['text']}\n   📅 {n['date']}\n\n"
-            await update.message.reply_text(msg, reply_markup=news_keyboard())
+        await send_page(update, "news", news_keyboard())
     elif text == "➕ Додати новину":
         await update.message.reply_text(
             "Введіть новину у форматі:\n<b>Заголовок | Текст</b>\n\n"
@@ -908,14 +2609,10 @@ async def news_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return ADD_NEWS
     elif text == "🗑 Видалити новину":
-        news = db_get_news()
-        if not news:
-            await update.message.reply_text("Новин немає.", reply_markup=news_keyboard())
-            return NEWS_MENU
-        keyboard = [[InlineKeyboardButton(n["title"], callback_data=f"del_news_{i}")] for i, n in enumerate(news)]
-        await update.message.reply_text("Оберіть новину для видалення:", reply_markup=InlineKeyboardMarkup(keyboard))
+        await send_page(update, "dnews", news_keyboard())
     return NEWS_MENU
 
+@timed
 async def add_news(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     if text == "⬅️ Головне меню":
@@ -929,11 +2626,12 @@ async def add_news(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if len(parts) < 2:
             raise ValueError("Потрібно 2 поля")
         news_item = {"title": parts[0], "text": parts[1], "date": datetime.now().strftime("%d.%m.%Y")}
-        db_add_news(news_item)
+        await run_db(db_add_news, news_item)
         notify_text = f"📢 {news_item['title']}\n\n{news_item['text']}"
-        sent = await notify_all(context, notify_text)
+        job = await notify_all(context, notify_text, report_to=update.effective_chat.id)
         await update.message.reply_text(
-            f"✅ Новину опубліковано! Надіслано {sent} повідомлень.",
+            f"✅ Новину опубліковано!\n"
+            f"📨 Розсилка #{job['ref']}: {job['total']} отримувачів, звіт надійде після завершення.",
             reply_markup=news_keyboard()
         )
     except Exception as e:
@@ -946,6 +2644,7 @@ async def add_news(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ─────────────────────────────────────────────
 # МАТЕРІАЛИ
 # ─────────────────────────────────────────────
+@timed
 async def materials_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_trainer(update): return ConversationHandler.END
     text = update.message.text
@@ -953,14 +2652,7 @@ async def materials_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Головне меню:", reply_markup=main_keyboard())
         return MAIN_MENU
     elif text == "📋 Показати матеріали":
-        materials = db_get_materials()
-        if not materials:
-            await update.message.reply_text("📭 Матеріалів немає.", reply_markup=materials_keyboard())
-        else:
-            msg = "🎓 Навчальні матеріали:\n\n"
-            for i, m in enumerate(materials, 1):
-                msg += f"{i}. {m['title']}\n   🔗 {m['link']}\n   📁 {m['category']}\n\n"
-            await update.message.reply_text(msg, reply_markup=materials_keyboard())
+        await send_page(update, "materials", materials_keyboard())
     elif text == "➕ Додати матеріал":
         await update.message.reply_text(
             "Введіть матеріал у форматі:\n<b>Назва | Посилання | Категорія</b>\n\n"
@@ -969,14 +2661,10 @@ async def materials_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return ADD_MATERIAL
     elif text == "🗑 Видалити матеріал":
-        materials = db_get_materials()
-        if not materials:
-            await update.message.reply_text("Матеріалів немає.", reply_markup=materials_keyboard())
-            return MATERIALS_MENU
-        keyboard = [[InlineKeyboardButton(m["title"], callback_data=f"del_material_{i}")] for i, m in enumerate(materials)]
-        await update.message.reply_text("Оберіть матеріал для видалення:", reply_markup=InlineKeyboardMarkup(keyboard))
+        await send_page(update, "dmaterial", materials_keyboard())
     return MATERIALS_MENU
 
+@timed
 async def add_material(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     if text == "⬅️ Головне меню":
@@ -991,7 +2679,7 @@ async def add_material(update: Update, context: ContextTypes.DEFAULT_TYPE):
             raise ValueError("Потрібно 3 поля")
         mat = {"title": parts[0], "link": parts[1], "category": parts[2],
                "date": datetime.now().strftime("%d.%m.%Y")}
-        db_add_material(mat)
+        await run_db(db_add_material, mat)
         await update.message.reply_text(f"✅ Матеріал '{mat['title']}' додано!", reply_markup=materials_keyboard())
     except Exception as e:
         await update.message.reply_text(
@@ -1003,6 +2691,7 @@ async def add_material(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ─────────────────────────────────────────────
 # ТУРНІРИ
 # ─────────────────────────────────────────────
+@timed
 async def tournaments_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_trainer(update): return ConversationHandler.END
     text = update.message.text
@@ -1010,17 +2699,7 @@ async def tournaments_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Головне меню:", reply_markup=main_keyboard())
         return MAIN_MENU
     elif text == "📋 Показати турніри":
-        tournaments = db_get_tournaments()
-        if not tournaments:
-            await update.message.reply_text("📭 Турнірів немає.", reply_markup=tournaments_keyboard())
-        else:
-            msg = "🏆 Турніри:\n\n"
-            for i, t in enumerate(tournaments, 1):
-                msg += (f"{i}. {t['title']}\n"
-                        f"   📅 {t['date']} | 📍 {t['place']}\n"
-                        f"   👥 Для: {t.get('for_group', 'Всі')}\n"
-                        f"   ℹ️ {t['info']}\n\n")
-            await update.message.reply_text(msg, reply_markup=tournaments_keyboard())
+        await send_page(update, "tournaments", tournaments_keyboard())
     elif text == "➕ Додати турнір":
         await update.message.reply_text(
             "Введіть турнір у форматі:\n<b>Назва | Дата | Місце | Для кого | Інфо</b>\n\n"
@@ -1030,16 +2709,10 @@ async def tournaments_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return ADD_TOURNAMENT
     elif text == "🗑 Видалити турнір":
-        tournaments = db_get_tournaments()
-        if not tournaments:
-            await update.message.reply_text("Турнірів немає.", reply_markup=tournaments_keyboard())
-            return TOURNAMENTS_MENU
-        keyboard = [[InlineKeyboardButton(
-            f"{t['title']} ({t.get('for_group','Всі')})", callback_data=f"del_tournament_{i}"
-        )] for i, t in enumerate(tournaments)]
-        await update.message.reply_text("Оберіть турнір для видалення:", reply_markup=InlineKeyboardMarkup(keyboard))
+        await send_page(update, "dtournament", tournaments_keyboard())
     return TOURNAMENTS_MENU
 
+@timed
 async def add_tournament(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     if text == "⬅️ Головне меню":
@@ -1052,15 +2725,18 @@ async def add_tournament(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parts = [p.strip() for p in text.split("|")]
         if len(parts) < 5:
             raise ValueError("Потрібно 5 полів")
+        group_id, group = await run_db(db_resolve_group, parts[3])
         t = {"title": parts[0], "date": parts[1], "place": parts[2],
-             "for_group": parts[3], "info": parts[4]}
-        db_add_tournament(t)
+             "for_group": group, "group_id": group_id, "info": parts[4]}
+        await run_db(db_add_tournament, t)
         notify_text = (f"🏆 Новий турнір!\n\n{t['title']}\n"
                        f"📅 {t['date']}\n📍 {t['place']}\n"
                        f"👥 Для: {t['for_group']}\nℹ️ {t['info']}")
-        sent = await notify_group(context, t["for_group"], notify_text)
+        job = await notify_group(context, t["group_id"], notify_text, report_to=update.effective_chat.id,
+                                 label=t["for_group"])
         await update.message.reply_text(
-            f"✅ Турнір додано!\n👥 Для: {t['for_group']}\n📨 Надіслано {sent} повідомлень.",
+            f"✅ Турнір додано!\n👥 Для: {t['for_group']}\n"
+            f"📨 Розсилка #{job['ref']}: {job['total']} отримувачів, звіт надійде після завершення.",
             reply_markup=tournaments_keyboard()
         )
     except Exception as e:
@@ -1073,6 +2749,7 @@ async def add_tournament(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ─────────────────────────────────────────────
 # ЧАТ З БАТЬКАМИ
 # ─────────────────────────────────────────────
+@timed
 async def chat_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_trainer(update): return ConversationHandler.END
     text = update.message.text
@@ -1080,47 +2757,29 @@ async def chat_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Головне меню:", reply_markup=main_keyboard())
         return MAIN_MENU
     elif text == "👥 Список батьків":
-        parents = db_get_parents()
-        if not parents:
-            await update.message.reply_text("📭 Жоден батько ще не зареєструвався.", reply_markup=chat_keyboard())
-        else:
-            msg = "👥 Зареєстровані батьки:\n\n"
-            for pid, info in parents.items():
-                msg += (f"• {info['name']}\n"
-                        f"  👤 {info.get('student','—')} | 👥 {info.get('group','—')}\n\n")
-            await update.message.reply_text(msg, reply_markup=chat_keyboard())
+        await send_page(update, "parents", chat_keyboard())
     elif text == "🔗 Прив'язати батька до учня":
-        parents = db_get_parents()
-        students = db_get_students()
-        if not parents:
-            await update.message.reply_text("📭 Батьків немає.", reply_markup=chat_keyboard())
-            return CHAT_MENU
-        if not students:
+        if not await run_db(db_has_documents, "students"):
             await update.message.reply_text("📭 Спочатку додайте учнів.", reply_markup=chat_keyboard())
             return CHAT_MENU
-        keyboard = [[InlineKeyboardButton(
-            f"{info['name']} → {info.get('student','—')}", callback_data=f"link_parent_{pid}"
-        )] for pid, info in parents.items()]
-        await update.message.reply_text("Оберіть батька для прив'язки:", reply_markup=InlineKeyboardMarkup(keyboard))
+        await send_page(update, "lparent", chat_keyboard())
     elif text == "📣 Розіслати всім батькам":
         await update.message.reply_text("Введіть повідомлення для розсилки:", reply_markup=back_keyboard())
         return BROADCAST_MSG
     return CHAT_MENU
 
+@timed
 async def broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text
     if text == "⬅️ Головне меню":
         await update.message.reply_text("Головне меню:", reply_markup=main_keyboard())
         return MAIN_MENU
-    sent = failed = 0
-    for pid in db_get_parents():
-        try:
-            await context.bot.send_message(chat_id=int(pid), text=f"📣 Від тренера:\n\n{text}")
-            sent += 1
-        except Exception:
-            failed += 1
+    parents = await run_db(db_get_parents)
+    messages = [(int(pid), f"📣 Від тренера:\n\n{text}") for pid in parents]
+    job = await broadcaster.submit(messages, "всім батькам", report_to=update.effective_chat.id)
     await update.message.reply_text(
-        f"✅ Розсилку завершено!\n📨 Надіслано: {sent}\n❌ Не вдалося: {failed}",
+        f"✅ Розсилку #{job['ref']} запущено!\n📨 Отримувачів: {job['total']}\n"
+        f"Звіт надійде після завершення.",
         reply_markup=chat_keyboard()
     )
     return CHAT_MENU
@@ -1128,6 +2787,7 @@ async def broadcast_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 # ─────────────────────────────────────────────
 # ВІДВІДУВАНІСТЬ
 # ─────────────────────────────────────────────
+@timed
 async def attendance_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_trainer(update): return ConversationHandler.END
     text = update.message.text
@@ -1135,83 +2795,133 @@ async def attendance_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("Головне меню:", reply_markup=main_keyboard())
         return MAIN_MENU
     elif text == "📝 Відмітити відвідуваність":
-        students = db_get_students()
+        students = await run_db(db_get_students)
         if not students:
             await update.message.reply_text("📭 Спочатку додайте учнів.", reply_markup=attendance_keyboard())
             return ATTENDANCE_MENU
         today = datetime.now().strftime("%d.%m.%Y")
-        keyboard = [[
-            InlineKeyboardButton(f"✅ {s['name']}", callback_data=f"att_present_{i}"),
-            InlineKeyboardButton(f"❌ {s['name']}", callback_data=f"att_absent_{i}")
-        ] for i, s in enumerate(students)]
-        keyboard.append([InlineKeyboardButton("💾 Зберегти", callback_data="att_save")])
-        context.user_data["attendance_today"] = {"date": today, "present": [], "absent": []}
+        # Знімок списку на всю сесію: кнопки посилаються на позицію в ньому, БД до збереження не читаємо
+        # Лише списки — сесія переживає перезапуск через persistence (BSON) без перетворень
+        att = {"date": today, "roster": [[s["id"], s["name"]] for s in students],
+               "present": [], "absent": []}
+        context.user_data["attendance_today"] = att
         await update.message.reply_text(
             f"📝 Відвідуваність на {today}\n✅ = присутній | ❌ = відсутній",
-            reply_markup=InlineKeyboardMarkup(keyboard)
+            reply_markup=attendance_marking_keyboard(att)
         )
     elif text == "📊 Статистика відвідуваності":
-        attendance = db_get_attendance()
-        if not attendance:
-            await update.message.reply_text("📭 Даних ще немає.", reply_markup=attendance_keyboard())
-            return ATTENDANCE_MENU
-        stats = {}
-        for record in attendance.values():
-            for name in record.get("present", []):
-                stats.setdefault(name, {"present": 0, "absent": 0})["present"] += 1
-            for name in record.get("absent", []):
-                stats.setdefault(name, {"present": 0, "absent": 0})["absent"] += 1
-        msg = "📊 Статистика відвідуваності:\n\n"
-        for name, data in stats.items():
-            total = data["present"] + data["absent"]
-            pct = round(data["present"] / total * 100) if total > 0 else 0
-            msg += f"👤 {name}\n   ✅ {data['present']} | ❌ {data['absent']} | 📊 {pct}%\n\n"
-        await update.message.reply_text(msg, reply_markup=attendance_keyboard())
+        await send_page(update, "attstats", attendance_keyboard())
     elif text == "📋 Журнал за датою":
-        attendance = db_get_attendance()
-        if not attendance:
-            await update.message.reply_text("📭 Даних ще немає.", reply_markup=attendance_keyboard())
+        msg, markup = await render_journal("a", 0)
+        await update.message.reply_text(msg, reply_markup=markup)
+    elif text == "📤 Експорт у файл":
+        await update.message.reply_text("📤 Що вивантажити?", reply_markup=export_keyboard())
+    elif context.user_data.pop("awaiting_journal_range", False):
+        try:
+            first, last = [datetime.strptime(p.strip(), "%d.%m.%Y") for p in text.split("-")]
+        except ValueError:
+            context.user_data["awaiting_journal_range"] = True
+            await update.message.reply_text("❌ Формат: ДД.ММ.РРРР - ДД.ММ.РРРР", reply_markup=attendance_keyboard())
             return ATTENDANCE_MENU
-        msg = "📋 Журнал відвідуваності:\n\n"
-        for key, record in sorted(attendance.items(), reverse=True)[:10]:
-            present = ", ".join(record.get("present", [])) or "—"
-            absent  = ", ".join(record.get("absent",  [])) or "—"
-            msg += f"📅 {record.get('date', key)}\n✅ {present}\n❌ {absent}\n\n"
-        await update.message.reply_text(msg, reply_markup=attendance_keyboard())
+        msg, markup = await render_journal(f"c{first:%d%m%Y}{last:%d%m%Y}", 0)
+        await update.message.reply_text(msg, reply_markup=markup)
     return ATTENDANCE_MENU
 
+def attendance_marking_keyboard(att: dict) -> InlineKeyboardMarkup:
+    """Кнопки відмітки; вже поставлена позначка підсвічена 🟢/🔴."""
+    keyboard = [[
+        InlineKeyboardButton(f"{'🟢' if i in att['present'] else '✅'} {name}", callback_data=f"att_present_{i}"),
+        InlineKeyboardButton(f"{'🔴' if i in att['absent'] else '❌'} {name}", callback_data=f"att_absent_{i}")
+    ] for i, (_, name) in enumerate(att["roster"])]
+    keyboard.append([InlineKeyboardButton("💾 Зберегти", callback_data="att_save")])
+    return InlineKeyboardMarkup(keyboard)
+
+JOURNAL_RANGES = {"w": "7 днів", "m": "30 днів", "a": "Все"}
+
+def journal_bounds(range_code: str) -> tuple:
+    """Код періоду → (початок, кінець) для запиту; c<ДДММРРРР><ДДММРРРР> — довільний період."""
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    if range_code == "w":
+        return today - timedelta(days=6), today + timedelta(days=1)
+    if range_code == "m":
+        return today - timedelta(days=29), today + timedelta(days=1)
+    if range_code.startswith("c"):
+        first = datetime.strptime(range_code[1:9], "%d%m%Y")
+        last = datetime.strptime(range_code[9:17], "%d%m%Y")
+        return min(first, last), max(first, last) + timedelta(days=1)
+    return None, None
+
+def journal_title(range_code: str, start, end) -> str:
+    if range_code.startswith("c"):
+        return f"{start:%d.%m.%Y} – {end - timedelta(days=1):%d.%m.%Y}"
+    return JOURNAL_RANGES.get(range_code, "Все")
+
+async def render_journal(range_code: str, page: int) -> tuple:
+    start, end = journal_bounds(range_code)
+    records, has_more = await run_db(db_get_attendance_page, start, end, page, JOURNAL_PAGE)
+    msg = f"📋 Журнал відвідуваності ({journal_title(range_code, start, end)}), стор. {page + 1}:\n\n"
+    if not records:
+        msg += "📭 Даних ще немає."
+    for record in records:
+        present = ", ".join(record.get("present", [])) or "—"
+        absent  = ", ".join(record.get("absent",  [])) or "—"
+        msg += f"📅 {record.get('date', record.get('key'))}\n✅ {present}\n❌ {absent}\n\n"
+    keyboard = [[InlineKeyboardButton(("• " if code == range_code else "") + label, callback_data=f"jr_{code}_0")
+                 for code, label in JOURNAL_RANGES.items()]
+                + [InlineKeyboardButton("📆 Період", callback_data="jr_custom")]]
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton("◀️", callback_data=f"jr_{range_code}_{page - 1}"))
+    if has_more:
+        nav.append(InlineKeyboardButton("▶️", callback_data=f"jr_{range_code}_{page + 1}"))
+    if nav:
+        keyboard.append(nav)
+    keyboard.append([InlineKeyboardButton(f"📤 {fmt.upper()}", callback_data=f"exp_att_{range_code}_{fmt}")
+                     for fmt in ("csv", "xlsx")])
+    return msg, InlineKeyboardMarkup(keyboard)
+
 # ─────────────────────────────────────────────
 # CALLBACK HANDLER
 # ─────────────────────────────────────────────
+@timed
 async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
     data = query.data
 
+    # Учні й батьки гортають лише матеріали і списки своєї групи; решта кнопок — тренерські
+    # (списки з телефонами, прив'язка, видалення, журнал, експорт)
+    if not is_trainer(update) and not data.startswith(("pg_materials_", "pg_my")):
+        return
+
     # ── Прив'язка батька ──
     if data.startswith("link_parent_"):
         pid = data.replace("link_parent_", "")
-        context.user_data["linking_parent_id"] = pid
-        students = db_get_students()
-        parent_name = db_get_parents().get(pid, {}).get("name", "?")
-        keyboard = [[InlineKeyboardButton(
-            f"{s['name']} ({s.get('group','?')})", callback_data=f"link_student_{i}"
-        )] for i, s in enumerate(students)]
-        await query.edit_message_text(
-            f"👤 Батько: <b>{parent_name}</b>\n\nОберіть учня:",
-            parse_mode="HTML", reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        msg, markup = await render_page("lstudent", 0, pid, await link_header(pid))
+        await query.edit_message_text(msg, reply_markup=markup)
+
+    elif data.startswith("pg_my"):
+        _, view, page = data.split("_")
+        uid = str(update.effective_user.id)
+        info = cached_identity(uid) or await run_db(db_resolve_user, uid) or {}
+        msg, markup = await render_group_page(view[2:], info.get("role"), info, int(page))
+        await query.edit_message_text(msg, reply_markup=markup)
+
+    elif data.startswith("pg_"):
+        _, view, page, *rest = data.split("_")
+        arg = rest[0] if rest else ""
+        header = await link_header(arg) if view == "lstudent" else ""
+        msg, markup = await render_page(view, int(page), arg, header)
+        await query.edit_message_text(msg, reply_markup=markup)
 
     elif data.startswith("link_student_"):
-        idx = int(data.split("_")[-1])
-        pid = context.user_data.get("linking_parent_id")
-        if not pid:
-            await query.edit_message_text("❌ Помилка. Спробуйте знову.")
+        _, _, pid, student_id = data.split("_")
+        student = await run_db(db_get_student, student_id)
+        if not student:
+            await query.edit_message_text("❌ Учня не знайдено. Спробуйте знову.")
             return
-        students = db_get_students()
-        student = students[idx]
-        db_link_parent_to_student(pid, student["name"], student.get("group",""), student.get("rank",""))
-        parent_name = db_get_parents().get(pid, {}).get("name", "?")
+        await run_db(db_link_parent_to_student, pid, student)
+        parent_name = (await run_db(db_get_parents)).get(pid, {}).get("name", "?")
         try:
             await context.bot.send_message(
                 chat_id=int(pid),
@@ -1227,126 +2937,257 @@ async def callback_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
             f"👥 Група: {student.get('group','')} | 🏅 {student.get('rank','')}"
         )
 
-    # ── Відвідуваність ──
-    elif data.startswith("att_present_"):
-        idx = int(data.split("_")[-1])
-        name = db_get_students()[idx]["name"]
-        att = context.user_data.get("attendance_today", {"date": "", "present": [], "absent": []})
-        if name not in att["present"]: att["present"].append(name)
-        if name in att["absent"]: att["absent"].remove(name)
-        context.user_data["attendance_today"] = att
-        await query.answer(f"✅ {name} — присутній(я)")
+    # ── Журнал відвідуваності ──
+    elif data == "jr_custom":
+        context.user_data["awaiting_journal_range"] = True
+        await query.edit_message_text("📆 Введіть період у форматі:\nДД.ММ.РРРР - ДД.ММ.РРРР")
 
-    elif data.startswith("att_absent_"):
+    elif data.startswith("jr_"):
+        _, range_code, page = data.split("_")
+        msg, markup = await render_journal(range_code, int(page))
+        await query.edit_message_text(msg, reply_markup=markup)
+
+    # ── Експорт ──
+    elif data.startswith("exp_"):
+        _, what, range_code, fmt = data.split("_")
+        # Сезонний журнал готується довго — окремою задачею, обробка апдейтів тренера не чекає
+        await context.bot.send_message(chat_id=query.message.chat_id, text="⏳ Готую файл, надішлю, щойно буде готовий.")
+        context.application.create_task(send_export(context, query.message.chat_id, what, range_code, fmt),
+                                        update=update)
+
+    # ── Відвідуваність ──
+    elif data.startswith("att_present_") or data.startswith("att_absent_"):
+        att = context.user_data.get("attendance_today")
         idx = int(data.split("_")[-1])
-        name = db_get_students()[idx]["name"]
-        att = context.user_data.get("attendance_today", {"date": "", "present": [], "absent": []})
-        if name not in att["absent"]: att["absent"].append(name)
-        if name in att["present"]: att["present"].remove(name)
-        context.user_data["attendance_today"] = att
-        await query.answer(f"❌ {name} — відсутній(я)")
+        if not att or "roster" not in att or not 0 <= idx < len(att["roster"]):
+            await query.edit_message_text("❌ Сесію відмітки завершено. Почніть знову.")
+            return
+        mark, other = ("present", "absent") if data.startswith("att_present_") else ("absent", "present")
+        if idx in att[mark]:
+            return
+        att[mark].append(idx)
+        if idx in att[other]:
+            att[other].remove(idx)
+        await query.edit_message_reply_markup(reply_markup=attendance_marking_keyboard(att))
 
     elif data == "att_save":
-        att = context.user_data.get("attendance_today", {})
-        date = att.get("date", datetime.now().strftime("%d.%m.%Y"))
-        db_save_attendance(date.replace(".", "-"), att)
-        # Сповіщаємо батьків відсутніх
-        for pid, info in db_get_parents().items():
+        session = context.user_data.pop("attendance_today", None)
+        if not session or "roster" not in session:
+            await query.edit_message_text("❌ Сесію відмітки завершено. Почніть знову.")
+            return
+        names = [name for _, name in session["roster"]]
+        date = session["date"]
+        att = {"date": date,
+               "present": [names[i] for i in sorted(session["present"])],
+               "absent": [names[i] for i in sorted(session["absent"])]}
+        await run_db(db_save_attendance, date.replace(".", "-"), att)
+        # Сповіщаємо батьків відсутніх і самих учнів
+        absent = att.get("absent", [])
+        messages = []
+        for pid, info in (await run_db(db_get_parents)).items():
             sname = info.get("student", "")
-            if sname and sname in att.get("absent", []):
-                try:
-                    await context.bot.send_message(
-                        chat_id=int(pid),
-                        text=f"⚠️ {sname} сьогодні ({date}) не з'явився(лась) на занятті."
-                    )
-                except Exception:
-                    pass
-        # Сповіщаємо учнів
-        for uid, info in db_get_student_users().items():
+            if sname and sname in absent:
+                messages.append((int(pid), f"⚠️ {sname} сьогодні ({date}) не з'явився(лась) на занятті."))
+        for uid, info in (await run_db(db_get_student_users)).items():
             sname = info.get("student_name", "")
-            if sname and sname in att.get("absent", []):
-                try:
-                    await context.bot.send_message(
-                        chat_id=int(uid),
-                        text=f"⚠️ Тренер відмітив тебе відсутнім сьогодні ({date})."
-                    )
-                except Exception:
-                    pass
+            if sname and sname in absent:
+                messages.append((int(uid), f"⚠️ Тренер відмітив тебе відсутнім сьогодні ({date})."))
+        if messages:
+            await broadcaster.submit(messages, f"відсутні {date}")
         present = ", ".join(att.get("present", [])) or "—"
         absent  = ", ".join(att.get("absent",  [])) or "—"
         await query.edit_message_text(f"✅ Відвідуваність збережено!\n\n📅 {date}\n✅ {present}\n❌ {absent}")
 
     # ── Видалення ──
     elif data.startswith("del_student_"):
-        idx = int(data.split("_")[-1])
-        students = db_get_students()
-        if 0 <= idx < len(students):
-            name = students[idx]["name"]
-            db_delete_student(idx)
-            await query.edit_message_text(f"🗑 Учня {name} видалено.")
+        s = await run_db(db_delete_student, data.split("_")[-1])
+        if s:
+            await query.edit_message_text(f"🗑 Учня {s['name']} видалено.")
         else:
             await query.edit_message_text("❌ Не знайдено.")
 
     elif data.startswith("del_schedule_"):
-        idx = int(data.split("_")[-1])
-        schedule = db_get_schedule()
-        if 0 <= idx < len(schedule):
-            s = schedule[idx]
-            db_delete_schedule(idx)
+        item_id = data.split("_")[-1]
+        s = await run_db(db_delete_schedule, item_id)
+        if s:
+            unschedule_lesson_reminders(context.job_queue, {**s, "id": item_id})
             await query.edit_message_text(f"🗑 Заняття {s['day']} {s['time']} ({s['group']}) видалено.")
         else:
             await query.edit_message_text("❌ Не знайдено.")
 
     elif data.startswith("del_hw_"):
-        idx = int(data.split("_")[-1])
-        homework = db_get_homework()
-        if 0 <= idx < len(homework):
-            db_delete_homework(idx)
+        if await run_db(db_delete_homework, data.split("_")[-1]):
             await query.edit_message_text("🗑 Завдання видалено.")
         else:
             await query.edit_message_text("❌ Не знайдено.")
 
     elif data.startswith("del_news_"):
-        idx = int(data.split("_")[-1])
-        news = db_get_news()
-        if 0 <= idx < len(news):
-            n = news[idx]
-            db_delete_news(idx)
+        n = await run_db(db_delete_news, data.split("_")[-1])
+        if n:
             await query.edit_message_text(f"🗑 Новину '{n['title']}' видалено.")
         else:
             await query.edit_message_text("❌ Не знайдено.")
 
     elif data.startswith("del_material_"):
-        idx = int(data.split("_")[-1])
-        materials = db_get_materials()
-        if 0 <= idx < len(materials):
-            m = materials[idx]
-            db_delete_material(idx)
+        m = await run_db(db_delete_material, data.split("_")[-1])
+        if m:
             await query.edit_message_text(f"🗑 Матеріал '{m['title']}' видалено.")
         else:
             await query.edit_message_text("❌ Не знайдено.")
 
     elif data.startswith("del_tournament_"):
-        idx = int(data.split("_")[-1])
-        tournaments = db_get_tournaments()
-        if 0 <= idx < len(tournaments):
-            t = tournaments[idx]
-            db_delete_tournament(idx)
+        t = await run_db(db_delete_tournament, data.split("_")[-1])
+        if t:
             await query.edit_message_text(f"🗑 Турнір '{t['title']}' видалено.")
         else:
             await query.edit_message_text("❌ Не знайдено.")
 
+# ─────────────────────────────────────────────
+# PERSISTENCE — переживає рестарти
+# ─────────────────────────────────────────────
+class MongoPersistence(BasePersistence):
+    """Стани розмов і user_data у Mongo.
+
+    Зміни буферизуються і записуються однією пачкою після кожного циклу
+    оновлення PTB (раз на PERSISTENCE_INTERVAL), а не на кожне повідомлення.
+    user_data читається з бази при першому зверненні користувача.
+    """
+
+    def __init__(self):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=PERSISTENCE_INTERVAL
+        )
+        self.loaded_users = set()
+        self.pending_users = {}
+        self.pending_conversations = {}
+        self.flush_task = None
+
+    def _schedule_flush(self):
+        # PTB викликає update_* для всіх змінених записів одночасно — пишемо, коли вони всі надійдуть
+        if self.flush_task is None or self.flush_task.done():
+            self.flush_task = asyncio.get_running_loop().create_task(self._flush_soon())
+
+    async def _flush_soon(self):
+        await asyncio.sleep(0.1)
+        await self.flush()
+
+    async def get_user_data(self) -> dict:
+        return {}
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return await run_db(db_load_conversations, name)
+
+    async def update_conversation(self, name: str, key: tuple, new_state):
+        self.pending_conversations[(name, key)] = new_state
+        self._schedule_flush()
+
+    async def update_user_data(self, user_id: int, data: dict):
+        # Копія в event loop: запис іде в потоці пулу, поки обробники можуть змінювати оригінал
+        self.pending_users[user_id] = bson_safe(data)
+        self._schedule_flush()
+
+    async def drop_user_data(self, user_id: int):
+        self.pending_users[user_id] = None
+        self._schedule_flush()
+
+    async def refresh_user_data(self, user_id: int, user_data: dict):
+        if user_id in self.loaded_users:
+            return
+        self.loaded_users.add(user_id)
+        for key, value in (await run_db(db_load_user_data, user_id)).items():
+            user_data.setdefault(key, value)
+
+    async def update_chat_data(self, chat_id: int, data: dict):
+        pass
+
+    async def update_bot_data(self, data: dict):
+        pass
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_chat_data(self, chat_id: int):
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict):
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict):
+        pass
+
+    async def flush(self):
+        users, self.pending_users = self.pending_users, {}
+        conversations, self.pending_conversations = self.pending_conversations, {}
+        if not users and not conversations:
+            return
+        try:
+            await run_db(db_save_persistence, users, conversations)
+        except Exception as e:
+            logger.warning(f"⚠️ Persistence: {e}")
+            # Повертаємо в буфер, не перетираючи новіші зміни
+            for user_id, data in users.items():
+                self.pending_users.setdefault(user_id, data)
+            for key, state in conversations.items():
+                self.pending_conversations.setdefault(key, state)
+
 # ─────────────────────────────────────────────
 # ЗАПУСК
 # ─────────────────────────────────────────────
-def main():
-    try:
-        init_mongo()
-    except Exception as e:
-        print(f"❌ КРИТИЧНА ПОМИЛКА MongoDB: {e}")
-        return
+async def post_init(app: Application):
+    # Нагадування і розсилки стартують, коли репліка стане лідером
+    leader.start(app)
+
+async def post_stop(app: Application):
+    await leader.stop(app)
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Апдейти різних користувачів — паралельно (до UPDATE_CONCURRENCY), одного користувача — строго по черзі.
+
+    Так повільний запит одного користувача не тримає решту, а стан розмови і user_data
+    (сесія відмічання відвідуваності) не змінюються двома апдейтами одночасно.
+    """
 
-    app = Application.builder().token(BOT_TOKEN).build()
+    def __init__(self, max_concurrent_updates: int):
+        super().__init__(max_concurrent_updates)
+        self.locks = {}   # uid/chat_id → [lock, скільки апдейтів тримають або чекають]
+
+    async def do_process_update(self, update, coroutine):
+        owner = (update.effective_user or update.effective_chat) if isinstance(update, Update) else None
+        if owner is None:
+            await coroutine
+            return
+        key = owner.id
+        entry = self.locks.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+def build_application(builder=None) -> Application:
+    """Application з усіма обробниками; builder можна підмінити (напр. фейковим Telegram API у навантажувальних тестах)."""
+    builder = builder or Application.builder().token(BOT_TOKEN)
+    app = (builder.persistence(MongoPersistence()).post_init(post_init).post_stop(post_stop)
+           .concurrent_updates(PerUserUpdateProcessor(UPDATE_CONCURRENCY)).build())
 
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler("start", start)],
@@ -1358,6 +3199,8 @@ def main():
             STUDENT_MENU:     [MessageHandler(filters.TEXT & ~filters.COMMAND, student_menu_handler)],
             STUDENTS_MENU:    [MessageHandler(filters.TEXT & ~filters.COMMAND, students_menu)],
             ADD_STUDENT:      [MessageHandler(filters.TEXT & ~filters.COMMAND, add_student)],
+            IMPORT_STUDENTS:  [MessageHandler((filters.TEXT & ~filters.COMMAND) | filters.Document.ALL,
+                                              import_students)],
             SCHEDULE_MENU:    [MessageHandler(filters.TEXT & ~filters.COMMAND, schedule_menu)],
             ADD_SCHEDULE:     [MessageHandler(filters.TEXT & ~filters.COMMAND, add_schedule)],
             HOMEWORK_MENU:    [MessageHandler(filters.TEXT & ~filters.COMMAND, homework_menu)],
@@ -1374,15 +3217,38 @@ def main():
             ADD_TOURNAMENT:   [MessageHandler(filters.TEXT & ~filters.COMMAND, add_tournament)],
         },
         fallbacks=[CommandHandler("start", start)],
-        allow_reentry=True
+        allow_reentry=True,
+        name="main",
+        persistent=True
     )
 
     app.add_handler(conv_handler)
     app.add_handler(CallbackQueryHandler(callback_handler))
-    app.job_queue.run_repeating(send_reminders, interval=3600, first=10)
+    return app
+
+def main():
+    try:
+        init_mongo()
+    except Exception as e:
+        print(f"❌ КРИТИЧНА ПОМИЛКА MongoDB: {e}")
+        return
+
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT, addr=METRICS_HOST)
+        logger.info(f"📈 Метрики: http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+
+    app = build_application()
 
     print("♟️ Chess Trainer Bot v5.0 запущено!")
-    app.run_polling(allowed_updates=Update.ALL_TYPES, drop_pending_updates=True)
+    if WEBHOOK_URL:
+        app.run_webhook(
+            listen="0.0.0.0", port=PORT, url_path=WEBHOOK_PATH,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{WEBHOOK_PATH}",
+            secret_token=WEBHOOK_SECRET,
+            allowed_updates=ALLOWED_UPDATES, drop_pending_updates=DROP_PENDING_UPDATES
+        )
+    else:
+        app.run_polling(allowed_updates=ALLOWED_UPDATES, drop_pending_updates=DROP_PENDING_UPDATES)
 
 if __name__ == "__main__":
     main()
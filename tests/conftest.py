@@ -0,0 +1,23 @@
+"""
+Тести на mongomock і фейковому Telegram API (ті самі, що в бенчмарках).
+
+    pip install -r requirements.txt -r requirements-dev.txt
+    python -m pytest -q
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from harness import bot, use_mongomock  # noqa: E402
+
+@pytest.fixture
+def db():
+    """Чиста база mongomock і скинуті кеші бота на кожен тест."""
+    use_mongomock()
+    bot.leader.holding = bot.leader.leading = False
+    bot.leader.valid_until = 0.0
+    yield bot
@@ -0,0 +1,30 @@
+def stats(db) -> dict:
+    return {s["name"]: (s.get("present", 0), s.get("absent", 0)) for s in db.col("attendance_stats").find({})}
+
+def test_resave_changes_counters_by_difference(db):
+    db.db_save_attendance("01-09-2025", {"present": ["Іван", "Олена"], "absent": ["Петро"]})
+    assert stats(db) == {"Іван": (1, 0), "Олена": (1, 0), "Петро": (0, 1)}
+
+    # Те саме заняття ще раз — нічого не подвоюється
+    db.db_save_attendance("01-09-2025", {"present": ["Іван", "Олена"], "absent": ["Петро"]})
+    assert stats(db) == {"Іван": (1, 0), "Олена": (1, 0), "Петро": (0, 1)}
+
+    # Виправили відмітки: Олена відсутня, Петро присутній, Іван прибраний зі списку
+    db.db_save_attendance("01-09-2025", {"present": ["Петро"], "absent": ["Олена"]})
+    assert stats(db) == {"Іван": (0, 0), "Олена": (0, 1), "Петро": (1, 0)}
+
+def test_different_dates_add_up(db):
+    db.db_save_attendance("01-09-2025", {"present": ["Іван"], "absent": []})
+    db.db_save_attendance("02-09-2025", {"present": ["Іван"], "absent": []})
+    db.db_save_attendance("03-09-2025", {"present": [], "absent": ["Іван"]})
+    assert stats(db) == {"Іван": (2, 1)}
+    assert db.col("attendance").count_documents({}) == 3
+
+def test_incremental_counters_match_full_rebuild(db):
+    db.db_save_attendance("01-09-2025", {"present": ["Іван", "Олена"], "absent": []})
+    db.db_save_attendance("01-09-2025", {"present": ["Іван"], "absent": ["Олена"]})
+    db.db_save_attendance("08-09-2025", {"present": ["Олена"], "absent": ["Іван"]})
+    incremental = stats(db)
+    db.db_rebuild_attendance_stats()
+    assert {name: counts for name, counts in stats(db).items() if any(counts)} == \
+           {name: counts for name, counts in incremental.items() if any(counts)}
@@ -0,0 +1,29 @@
+from datetime import datetime
+
+import pytest
+
+from harness import bot
+
+TODAY = datetime(2025, 11, 20)
+
+@pytest.mark.parametrize("text, expected", [
+    ("15.03.2026", datetime(2026, 3, 15)),
+    ("15.03.26", datetime(2026, 3, 15)),
+    (" 15/03/2026 ", datetime(2026, 3, 15)),
+    ("15-03-2026", datetime(2026, 3, 15)),
+    ("01.01.2020", datetime(2020, 1, 1)),        # повна дата в минулому — як є
+    ("25.11", datetime(2025, 11, 25)),           # ще цього року
+    ("20.11", datetime(2025, 11, 20)),           # сьогодні — не переноситься
+    ("19.11", datetime(2026, 11, 19)),           # вже минуло — наступного року
+    ("05/01", datetime(2026, 1, 5)),
+    ("29.02", None),                             # 2025 не високосний
+    ("31.04", None),
+    ("завтра", None),
+    ("", None),
+    ("15.03.2026 18:00", None),
+])
+def test_parse_deadline(text, expected):
+    assert bot.parse_deadline(text, TODAY) == expected
+
+def test_feb_29_in_leap_year():
+    assert bot.parse_deadline("29.02", datetime(2028, 1, 10)) == datetime(2028, 2, 29)
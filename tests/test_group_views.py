@@ -0,0 +1,72 @@
+import asyncio
+
+from telegram.ext import Application, CallbackContext
+
+from harness import FakeTelegramRequest, bot, callback_update, text_update
+
+class RecordingRequest(FakeTelegramRequest):
+    """Запам'ятовує параметри відправлених і відредагованих повідомлень."""
+
+    def __init__(self):
+        super().__init__()
+        self.sent = []
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        if url.rsplit("/", 1)[-1] in ("sendMessage", "editMessageText"):
+            self.sent.append(request_data.parameters)
+        return await super().do_request(url, method, request_data, **kwargs)
+
+def run(*steps) -> list:
+    """Проганяє (обробник, фабрика апдейту, uid, текст/дані) по черзі; повертає надіслані повідомлення."""
+    request = RecordingRequest()
+
+    async def scenario():
+        app = (Application.builder().token(bot.BOT_TOKEN)
+               .request(request).get_updates_request(FakeTelegramRequest()).build())
+        await app.initialize()
+        try:
+            for handler, make_update, uid, payload in steps:
+                update = make_update(app.bot, uid, payload)
+                await handler(update, CallbackContext.from_update(update, app))
+        finally:
+            await app.shutdown()
+
+    asyncio.run(scenario())
+    return request.sent
+
+def seed_student(uid: int = 501):
+    student = bot.db_student_groups({"name": "Іван", "group": "Старша", "rank": "1 розряд"})
+    bot.db_add_student(student)
+    bot.db_upsert_student_user(str(uid), "Іван", student)
+    return student
+
+def nav_buttons(message: dict) -> list:
+    markup = message.get("reply_markup")
+    rows = markup.get("inline_keyboard", []) if isinstance(markup, dict) else []
+    return [button["callback_data"] for row in rows for button in row]
+
+def test_long_tournament_list_is_paged_for_students(db):
+    student = seed_student()
+    for i in range(60):
+        db.db_add_tournament({"title": f"Турнір {i}", "date": "01.05.2026", "place": "Клуб",
+                              "for_group": "Старша", "group_id": student["group_id"], "info": "Опис " * 20})
+
+    first, second = run((db.student_menu_handler, text_update, 501, "🏆 Турніри"),
+                        (db.callback_handler, callback_update, 501, "pg_mytournaments_1"))
+    assert all(len(m["text"]) <= db.MESSAGE_LIMIT for m in (first, second))
+    assert "стор. 1/" in first["text"] and "Турнір 0\n" in first["text"]
+    assert nav_buttons(first) == ["pg_mytournaments_1"]
+    assert "стор. 2/" in second["text"] and "Турнір 0\n" not in second["text"]
+    assert nav_buttons(second) == ["pg_mytournaments_0", "pg_mytournaments_2"]
+
+def test_short_list_keeps_menu_keyboard(db):
+    student = seed_student()
+    db.db_add_tournament({"title": "Кубок", "date": "01.05.2026", "place": "Клуб",
+                          "for_group": "Старша", "group_id": student["group_id"], "info": "—"})
+    [message] = run((db.student_menu_handler, text_update, 501, "🏆 Турніри"))
+    assert "Кубок" in message["text"] and "стор." not in message["text"]
+    assert nav_buttons(message) == []
+
+def test_trainer_pages_stay_closed_to_students(db):
+    seed_student()
+    assert run((db.callback_handler, callback_update, 501, "pg_students_1")) == []
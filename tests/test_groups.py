@@ -0,0 +1,47 @@
+from bson import ObjectId
+
+from harness import bot
+
+def group_name(group_id: str) -> str:
+    return bot.col("groups").find_one({"_id": ObjectId(group_id)})["name"]
+
+def test_migration_links_students_and_targets_by_exact_name(db, caplog):
+    db.col("students").insert_many([
+        {"name": "Іван", "group": "Старша група", "rank": "1 розряд"},
+        {"name": "Олена", "group": "  старша   ГРУПА ", "rank": "11 розряд"},
+    ])
+    db.col("parents").insert_one({"_id": 7, "name": "Мама Олени", "group": "Старша група", "rank": "11 розряд"})
+    db.col("homework").insert_many([
+        {"task": "Етюди", "group": "старша група"},
+        {"task": "Гамбіти", "group": "1 розряд"},
+        {"task": "Для всіх", "group": "Всі"},
+        {"task": "Задачі", "group": "1"},
+    ])
+
+    assert db.db_ensure_group_ids() == 7
+
+    ivan = db.col("students").find_one({"name": "Іван"})
+    olena = db.col("students").find_one({"name": "Олена"})
+    assert ivan["group_id"] == olena["group_id"]
+    assert olena["group"] == "Старша група"
+    assert ivan["rank_id"] != olena["rank_id"]
+    assert db.col("parents").find_one({"_id": 7})["rank_id"] == olena["rank_id"]
+
+    homework = {hw["task"]: hw for hw in db.col("homework").find({})}
+    assert homework["Етюди"]["group_id"] == ivan["group_id"]
+    assert homework["Гамбіти"]["group_id"] == ivan["rank_id"]        # ціль може бути розрядом
+    assert homework["Для всіх"]["group_id"] is None
+    # "1" більше не збігається за підрядком з "1 розряд" чи "11 розряд": окрема група без учнів
+    assert group_name(homework["Задачі"]["group_id"]) == "1"
+    assert homework["Задачі"]["group_id"] not in (ivan["rank_id"], olena["rank_id"])
+    assert "«1»" in caplog.text
+
+def test_migration_is_idempotent(db):
+    db.col("students").insert_one({"name": "Іван", "group": "Молодша", "rank": "3 розряд"})
+    db.col("schedule").insert_one({"day": "Понеділок", "time": "16:00", "group": "Молодша"})
+    assert db.db_ensure_group_ids() == 2
+    before = list(db.col("schedule").find({})) + list(db.col("students").find({}))
+
+    assert db.db_ensure_group_ids() == 0
+    assert list(db.col("schedule").find({})) + list(db.col("students").find({})) == before
+    assert db.col("groups").count_documents({}) == 2
@@ -0,0 +1,34 @@
+import asyncio
+from collections import Counter
+from datetime import datetime, timedelta
+
+from telegram.ext import Application, CallbackContext
+
+from harness import FakeTelegramRequest, bot, text_update
+
+def add_homework(text: str) -> Counter:
+    calls = Counter()
+
+    async def scenario():
+        app = (Application.builder().token(bot.BOT_TOKEN)
+               .request(FakeTelegramRequest(calls)).get_updates_request(FakeTelegramRequest()).build())
+        await app.initialize()
+        try:
+            update = text_update(app.bot, bot.TRAINER_ID, text)
+            await bot.add_homework(update, CallbackContext.from_update(update, app))
+        finally:
+            await app.shutdown()
+
+    asyncio.run(scenario())
+    return calls
+
+def test_past_deadline_is_rejected(db):
+    yesterday = datetime.now() - timedelta(days=1)
+    add_homework(f"Старша | Етюди | {yesterday:%d.%m.%Y}")
+    assert db.col("homework").count_documents({}) == 0
+    assert db.col("outbox_jobs").count_documents({}) == 0   # групу не сповіщено
+
+def test_short_deadline_is_saved_and_visible(db):
+    soon = datetime.now() + timedelta(days=3)
+    add_homework(f"Старша | Етюди | {soon:%d.%m}")
+    assert [hw["task"] for hw in db.db_get_homework()] == ["Етюди"]
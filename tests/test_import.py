@@ -0,0 +1,42 @@
+from harness import bot
+
+def seed(db):
+    student = db.db_student_groups({"name": "Іван", "group": "Молодша", "rank": "3 розряд",
+                                    "parent_phone": "+380500000001", "student_phone": "+380670000001"})
+    db.db_add_student(student)
+    db.db_upsert_parent("11", "Мама Івана", student)
+    db.db_upsert_student_user("12", "Іван", student)
+    return student
+
+def row(**changes) -> dict:
+    return {"name": "Іван", "group": "Молодша", "rank": "3 розряд",
+            "parent_phone": "+380500000001", "student_phone": "+380670000001", **changes}
+
+def test_group_change_follows_to_parents_and_student_accounts(db):
+    old = seed(db)
+    assert sorted(db.db_get_audience(old["group_id"])) == [11, 12]
+
+    result = db.db_import_students([row(group="Старша", rank="2 розряд")])
+    assert (result["inserted"], result["updated"], result["relinked"]) == (0, 1, 2)
+    assert result["moved"] == [("Іван", "Молодша/3 розряд", "Старша/2 розряд")]
+
+    new_group, _ = db.db_resolve_group("Старша")
+    for name, uid_field, uid in (("parents", "pid", "11"), ("student_users", "uid", "12")):
+        doc = db.col(name).find_one({uid_field: uid})
+        assert (doc["group"], doc["rank"], doc["group_id"]) == ("Старша", "2 розряд", new_group)
+        assert db.db_resolve_user(uid)["group_id"] == new_group
+    assert sorted(db.db_get_audience(new_group)) == [11, 12]
+    assert db.db_get_audience(old["group_id"]) == []
+
+def test_unchanged_group_is_not_reported(db):
+    seed(db)
+    version = db.db_get_version("parents")
+    result = db.db_import_students([row(parent_phone="+380500000001"), row(name="Олена", student_phone="+380679999999")])
+    assert (result["inserted"], result["updated"], result["moved"], result["relinked"]) == (1, 1, [], 0)
+    assert db.db_get_version("parents") == version
+
+def test_row_without_student_phone_matches_by_name_and_parent_phone(db):
+    seed(db)
+    result = bot.db_import_students([row(student_phone="", rank="1 розряд")])
+    assert result["moved"] == [("Іван", "Молодша/3 розряд", "Молодша/1 розряд")]
+    assert db.col("parents").find_one({"pid": "11"})["rank"] == "1 розряд"
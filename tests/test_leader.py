@@ -0,0 +1,109 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from telegram.ext import Application
+
+from harness import FakeTelegramRequest, bot
+
+def expire_lease():
+    bot.col("leases").update_one({"_id": "scheduler"}, {"$set": {"expires": datetime.utcnow() - timedelta(seconds=1)}})
+
+def test_lease_is_exclusive_until_expired_or_released(db):
+    assert db.db_acquire_lease("scheduler", "a", 15)
+    assert db.db_acquire_lease("scheduler", "a", 15)        # продовження
+    assert not db.db_acquire_lease("scheduler", "b", 15)
+
+    expire_lease()
+    assert db.db_acquire_lease("scheduler", "b", 15)        # перехоплення після TTL
+    assert not db.db_acquire_lease("scheduler", "a", 15)
+
+    db.db_release_lease("scheduler", "a")                   # чужий lease не звільняється
+    assert not db.db_acquire_lease("scheduler", "a", 15)
+    db.db_release_lease("scheduler", "b")
+    assert db.db_acquire_lease("scheduler", "a", 15)
+
+def test_renew_tracks_holding_but_not_leading(db):
+    first, second = db.LeaderLease("scheduler"), db.LeaderLease("scheduler")
+
+    async def scenario():
+        assert await first.renew()
+        assert not await second.renew()
+        expire_lease()
+        assert await second.renew()
+        assert not await first.renew()
+
+    asyncio.run(scenario())
+    assert second.holding and not second.is_leader   # лідер лише після _take_over
+
+def fake_app() -> Application:
+    return (Application.builder().token(bot.BOT_TOKEN)
+            .request(FakeTelegramRequest()).get_updates_request(FakeTelegramRequest()).build())
+
+async def wait_for(condition, timeout: float = 3.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        await asyncio.sleep(0.02)
+    return True
+
+def test_leader_steps_down_on_loss_and_takes_over_again(db, monkeypatch):
+    monkeypatch.setattr(db, "LEASE_RENEW", 0.05)
+
+    async def scenario():
+        app = fake_app()
+        await app.initialize()
+        await app.start()
+        try:
+            db.leader.start(app)
+            assert await wait_for(lambda: db.leader.is_leader)
+            assert db.broadcaster.worker is not None
+            assert app.job_queue.get_jobs_by_name("homework:catchup")
+
+            # Lease перехопила інша репліка (наприклад, після паузи GC довшої за TTL)
+            db.col("leases").update_one({"_id": "scheduler"},
+                                        {"$set": {"holder": "other", "expires": datetime.utcnow() + timedelta(hours=1)}})
+            assert await wait_for(lambda: not db.leader.holding)
+            assert not db.leader.is_leader
+            assert db.broadcaster.worker is None
+            assert not app.job_queue.get_jobs_by_name("homework:archive")
+
+            # Інша репліка зупинилась і звільнила lease
+            db.db_release_lease("scheduler", "other")
+            assert await wait_for(lambda: db.leader.is_leader)
+        finally:
+            await db.leader.stop(app)
+            await app.stop()
+            await app.shutdown()
+        return db.col("leases").count_documents({})
+
+    assert asyncio.run(scenario()) == 0   # при зупинці lease звільняється одразу
+
+def test_failed_takeover_is_retried(db, monkeypatch):
+    monkeypatch.setattr(db, "LEASE_RENEW", 0.05)
+    resume = db.db_outbox_resume
+    calls = []
+
+    def flaky_resume():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("Mongo недоступна")
+        return resume()
+
+    monkeypatch.setattr(db, "db_outbox_resume", flaky_resume)
+
+    async def scenario():
+        app = fake_app()
+        await app.initialize()
+        await app.start()
+        try:
+            db.leader.start(app)
+            return await wait_for(lambda: db.leader.is_leader)
+        finally:
+            await db.leader.stop(app)
+            await app.stop()
+            await app.shutdown()
+
+    assert asyncio.run(scenario())
+    assert len(calls) == 2
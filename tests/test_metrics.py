@@ -0,0 +1,20 @@
+from telegram import Bot
+
+from harness import bot, callback_update
+
+def action(data: str) -> str:
+    return bot.update_action(callback_update(Bot(bot.BOT_TOKEN), bot.TRAINER_ID, data))
+
+def test_callback_labels_do_not_grow_with_ids_or_dates():
+    assert action("att_present_3") == "att_present"
+    assert action("del_student_65f0c0ffee0000000000abcd") == "del_student"
+    assert action("jr_custom") == "jr_custom"
+    assert action("jr_c0101202531012025_0") == action("jr_c0102202528022025_3") == "jr_custom"
+    assert action("jr_w_2") == "jr"
+    assert action("exp_att_c0101202531012025_csv") == "exp_att"
+    assert action("pg_students_4") == action("pg_lstudent_0_123") == "pg"
+    assert action("anything_else") == "other"
+
+def test_every_label_is_from_the_fixed_set():
+    assert {action(data) for data in ("att_save", "link_parent_1", "exp_students_a_xlsx", "x")} <= \
+           set(bot.CALLBACK_ACTIONS.values()) | {"other"}
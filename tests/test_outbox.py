@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+@pytest.fixture
+def job(db):
+    job = {"id": "a" * 32, "title": "Новина", "total": 2, "report_to": 1}
+    db.db_outbox_enqueue(job, [(101, "привіт"), (102, "привіт")])
+    return job
+
+def claim_all(db) -> dict:
+    db.col("outbox").update_many({"status": "pending"}, {"$set": {"next_at": datetime.utcnow()}})
+    return {doc["chat_id"]: doc for doc in db.db_outbox_claim(10)}
+
+def test_retry_backs_off_exponentially_then_fails(db, job, monkeypatch):
+    monkeypatch.setattr(db, "OUTBOX_BACKOFF", 5.0)
+    monkeypatch.setattr(db, "OUTBOX_MAX_ATTEMPTS", 3)
+    for attempt, delay in ((1, 5), (2, 10)):
+        doc = claim_all(db)[101]
+        started = datetime.utcnow()
+        db.db_outbox_finish([(doc, "retry")])
+        saved = db.col("outbox").find_one({"_id": doc["_id"]})
+        assert saved["status"] == "pending"
+        assert saved["attempts"] == attempt
+        assert timedelta(seconds=delay - 1) < saved["next_at"] - started <= timedelta(seconds=delay + 1)
+        assert not db.db_outbox_claim(10)   # до next_at повідомлення не береться
+
+    doc = claim_all(db)[101]
+    db.db_outbox_finish([(doc, "retry")])
+    saved = db.col("outbox").find_one({"_id": doc["_id"]})
+    assert (saved["status"], saved["attempts"]) == ("failed", 3)
+
+def test_stale_claim_does_not_overwrite_new_one(db, job):
+    first = claim_all(db)[101]
+    db.col("outbox").update_one({"_id": first["_id"]},
+                                {"$set": {"claimed_at": datetime.utcnow() - timedelta(seconds=db.OUTBOX_STALE + 1)}})
+    second = db.db_outbox_claim(10)[0]
+    assert second["claim"] != first["claim"]
+    db.db_outbox_finish([(first, "sent")])
+    assert db.col("outbox").find_one({"_id": first["_id"]})["status"] == "sending"
+
+def test_completed_job_is_reported_exactly_once(db, job):
+    docs = claim_all(db)
+    db.db_outbox_finish([(docs[101], "sent")])
+    assert db.db_outbox_completed_jobs([job["id"]]) == []   # 102 ще в черзі
+
+    db.db_outbox_finish([(docs[102], "blocked")])
+    done = db.db_outbox_completed_jobs([job["id"], job["id"]])
+    assert done == [{"id": job["id"], "ref": job["id"][:6], "title": "Новина", "report_to": 1,
+                     "sent": 1, "blocked": 1, "failed": 0}]
+    assert db.db_outbox_completed_jobs([job["id"]]) == []
+
+def test_job_without_recipients_is_never_reported(db):
+    db.db_outbox_enqueue({"id": "b" * 32, "title": "Порожньо", "total": 0, "report_to": 1}, [])
+    assert db.db_outbox_completed_jobs(["b" * 32]) == []
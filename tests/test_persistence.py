@@ -0,0 +1,36 @@
+import asyncio
+import pickle
+
+from bson import Binary
+
+def test_user_data_round_trips_as_bson(db):
+    session = {"date": "01.09.2025", "roster": [("id1", "Іван"), ("id2", "Олена")], "present": {1}, "absent": set()}
+
+    async def scenario():
+        saving = db.MongoPersistence()
+        await saving.update_user_data(1, {"attendance_today": session})
+        await saving.flush()
+        restored = {}
+        await db.MongoPersistence().refresh_user_data(1, restored)
+        return restored
+
+    restored = asyncio.run(scenario())
+    assert restored == {"attendance_today": {"date": "01.09.2025", "roster": [["id1", "Іван"], ["id2", "Олена"]],
+                                             "present": [1], "absent": []}}
+    assert isinstance(db.col("user_data").find_one({"_id": 1})["data"], dict)
+
+def test_legacy_pickled_user_data_is_not_unpickled(db):
+    db.col("user_data").insert_one({"_id": 2, "data": Binary(pickle.dumps({"x": 1}))})
+    assert db.db_load_user_data(2) == {}
+
+def test_copy_is_taken_when_buffered(db):
+    data = {"marks": [1]}
+
+    async def scenario():
+        persistence = db.MongoPersistence()
+        await persistence.update_user_data(3, data)
+        data["marks"].append(2)   # обробник змінює user_data, поки запис чекає в буфері
+        await persistence.flush()
+
+    asyncio.run(scenario())
+    assert db.db_load_user_data(3) == {"marks": [1]}
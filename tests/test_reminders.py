@@ -0,0 +1,53 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from telegram.ext import Application
+
+from harness import FakeTelegramRequest, bot
+
+KYIV = ZoneInfo("Europe/Kyiv")
+
+def utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+def test_reminder_keeps_lead_across_spring_forward(monkeypatch):
+    monkeypatch.setattr(bot, "TIMEZONE", KYIV)
+    # Пт 27.03.2026 (UTC+2) ставимо нагадування на Пн 30.03 18:00 — вже UTC+3, тобто 15:00 UTC
+    lesson = {"day": "Пн", "time": "18:00"}
+    assert bot.reminder_at(lesson, 2, utc(2026, 3, 27, 12)) == utc(2026, 3, 30, 13)
+    assert bot.reminder_at(lesson, 24, utc(2026, 3, 27, 12)) == utc(2026, 3, 29, 15)
+
+def test_reminder_keeps_lead_across_fall_back(monkeypatch):
+    monkeypatch.setattr(bot, "TIMEZONE", KYIV)
+    # Нд 25.10.2026 о 04:00 годинник переводять назад: заняття Нд 10:00 — це вже 08:00 UTC
+    lesson = {"day": "Нд", "time": "10:00"}
+    assert bot.reminder_at(lesson, 2, utc(2026, 10, 24, 12)) == utc(2026, 10, 25, 6)
+    assert bot.reminder_at(lesson, 24, utc(2026, 10, 23, 12)) == utc(2026, 10, 24, 8)
+
+def test_reminder_skips_lesson_that_is_too_close(monkeypatch):
+    monkeypatch.setattr(bot, "TIMEZONE", KYIV)
+    lesson = {"day": "Пн", "time": "18:00"}
+    # За годину до заняття нагадування "за 2 години" вже запізно — наступний тиждень
+    assert bot.reminder_at(lesson, 2, utc(2026, 5, 4, 14)) == utc(2026, 5, 11, 13)
+    assert bot.reminder_at({"day": "Понеділок", "time": "18:00"}, 2, utc(2026, 5, 4, 14)) is None
+
+def test_daily_jobs_follow_local_time(monkeypatch):
+    monkeypatch.setattr(bot, "TIMEZONE", KYIV)
+
+    async def scenario():
+        app = (Application.builder().token(bot.BOT_TOKEN)
+               .request(FakeTelegramRequest()).get_updates_request(FakeTelegramRequest()).build())
+        await app.initialize()
+        await app.start()
+        try:
+            bot.schedule_homework_jobs(app.job_queue)
+            [job] = app.job_queue.get_jobs_by_name("homework:archive")
+            return job.next_t
+        finally:
+            await app.stop()
+            await app.shutdown()
+
+    next_t = asyncio.run(scenario()).astimezone(KYIV)
+    assert (next_t.hour, next_t.minute) == (0, 5)
+    assert next_t - datetime.now(KYIV) <= timedelta(days=1)
@@ -0,0 +1,53 @@
+import asyncio
+import hashlib
+import socket
+import time
+from collections import Counter
+
+import httpx
+from telegram.ext import Application
+
+from harness import FakeTelegramRequest, bot, text_update_data
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def test_secret_is_same_in_every_process():
+    assert bot.WEBHOOK_SECRET == hashlib.sha256(f"webhook:{bot.BOT_TOKEN}".encode()).hexdigest()
+
+def test_webhook_accepts_json_with_secret_and_rejects_without(db):
+    calls = Counter()
+
+    async def scenario():
+        builder = (Application.builder().token(bot.BOT_TOKEN)
+                   .request(FakeTelegramRequest(calls)).get_updates_request(FakeTelegramRequest()))
+        app = bot.build_application(builder)
+        port = free_port()
+        await app.initialize()
+        await app.updater.start_webhook(listen="127.0.0.1", port=port, url_path=bot.WEBHOOK_PATH,
+                                        webhook_url=f"https://bot.example/{bot.WEBHOOK_PATH}",
+                                        secret_token=bot.WEBHOOK_SECRET, allowed_updates=bot.ALLOWED_UPDATES)
+        await app.start()
+        try:
+            url = f"http://127.0.0.1:{port}/{bot.WEBHOOK_PATH}"
+            async with httpx.AsyncClient() as client:
+                rejected = await client.post(url, json=text_update_data(bot.TRAINER_ID, "/start"),
+                                             headers={"X-Telegram-Bot-Api-Secret-Token": "wrong"})
+                accepted = await client.post(url, json=text_update_data(bot.TRAINER_ID, "/start"),
+                                             headers={"X-Telegram-Bot-Api-Secret-Token": bot.WEBHOOK_SECRET})
+            deadline = time.monotonic() + 5
+            while not calls["sendMessage"] and time.monotonic() < deadline:
+                await asyncio.sleep(0.02)
+        finally:
+            await app.updater.stop()
+            await app.stop()
+            await app.shutdown()
+        return rejected.status_code, accepted.status_code
+
+    rejected, accepted = asyncio.run(scenario())
+    assert rejected == 403
+    assert accepted == 200
+    assert calls["setWebhook"] == 1
+    assert calls["sendMessage"] == 1   # /start тренера дійшов до обробника і отримав меню